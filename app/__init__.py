@@ -9,6 +9,11 @@ from flask_mail import Mail
 from flask_moment import Moment
 from dotenv import load_dotenv
 from authlib.integrations.flask_client import OAuth
+from redis import Redis
+import rq
+from app.uploads import UploadRequest
+from app.db_metrics import TimedQueuePool, install_slow_query_log
+from app import logs
 
 # Initialiseer Flask-extensies
 db = SQLAlchemy()
@@ -21,11 +26,26 @@ load_dotenv()  # Laad omgevingsvariabelen uit .env bestand
 
 def create_app():
     app = Flask(__name__, static_folder='static')
+    # Uploads worden tijdens het parsen gecontroleerd en naar schijf gespoold
+    app.request_class = UploadRequest
     app.config.from_object(Config)
+    # Logging eerst, zodat de request-id er is voor alle andere hooks (zie app.logs)
+    logs.init_app(app)
     app.secret_key = os.getenv('APP_SECRET_KEY')
+    app.redis = Redis.from_url(app.config['REDIS_URL'])
+    app.task_queue = rq.Queue('famplan-tasks', connection=app.redis)
+
+    # Pool met wachttijd-metingen voor server-databases (zie app.db_metrics)
+    if app.config['SQLALCHEMY_ENGINE_OPTIONS']:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'poolclass': TimedQueuePool, **app.config['SQLALCHEMY_ENGINE_OPTIONS']
+        }
+        TimedQueuePool.wait_warning = app.config['DB_POOL_WAIT_WARN_MS'] / 1000
 
     # Initialiseer extensies met app
     db.init_app(app)
+    with app.app_context():
+        install_slow_query_log(db.engine, app.config['DB_SLOW_QUERY_MS'] / 1000)
     migrate.init_app(app, db)
     mail.init_app(app)
     moment.init_app(app)
@@ -42,8 +62,9 @@ def create_app():
 
     # Configureer logging (alleen in productie)
     if not app.debug:
-        # Email-logging voor errors
-        if app.config['MAIL_SERVER']:
+        # Email-logging voor errors; via een wachtrij, zodat een trage SMTP-server
+        # niet het request ophoudt dat de fout logt (zie logs.start_queue_listener)
+        if app.config['MAIL_SERVER'] and app.config['ADMINS']:
             auth = None
             if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
                 auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
@@ -56,26 +77,61 @@ def create_app():
                 toaddrs=app.config['ADMINS'], subject='famplan Failure',
                 credentials=auth, secure=secure)
             mail_handler.setLevel(logging.ERROR)
-            app.logger.addHandler(mail_handler)
+            app.logger.addHandler(logs.start_queue_listener(mail_handler))
 
         # File-logging voor alle events
         if not os.path.exists('logs'):
             os.mkdir('logs')
         file_handler = RotatingFileHandler('logs/famplan.log', maxBytes=10240, backupCount=10)
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+        logs.configure_handler(file_handler, app)
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
 
-        app.logger.setLevel(logging.INFO)
         app.logger.info('famplan startup')
 
     # Importeer app-modules
     from app import routes, models
+
+    # Prometheus-metrics (/metrics); vóór de routes, zodat de timer als eerste start
+    from app import metrics
+    metrics.init_app(app, db)
+
     routes.register_routes(app)
 
+    # Gebundeld wegschrijven van last_seen
+    from app.last_seen import tracker as last_seen_tracker
+    last_seen_tracker.init_app(app)
+
+    # Nieuwe posts en notificaties na de commit pushen (SSE, zie app.push)
+    from app.push import hub as push_hub
+    push_hub.init_app(app)
+
+    # Notificatie-feed in Redis voor de /notifications-poll (optioneel)
+    from app.notifications import notification_feed
+    notification_feed.init_app(app)
+
+    # Full-text search over chatposts en berichten (SQLite: FTS5-index bijwerken)
+    from app import search
+    search.init_app(app)
+
     # Registreer calendar blueprint
     from app.calendar import bp as calendar_bp
     app.register_blueprint(calendar_bp)
 
+    from app.calendar_service import GoogleCalendarService, _http_pool
+    GoogleCalendarService.http_timeout = app.config['GOOGLE_HTTP_TIMEOUT']
+    _http_pool.size = app.config['GOOGLE_HTTP_POOL_SIZE']
+
+    # Profielfoto's staan content-addressed op schijf (zie app.image_store)
+    from app.image_store import image_store
+    image_store.init_app(app)
+
+    # Google-tokens hergebruiken, verversen en terugschrijven
+    from app.calendar_credentials import credentials_manager
+    credentials_manager.init_app(app)
+
+    # Lokale opslag van Google Calendar-evenementen
+    from app.event_store import event_store
+    event_store.init_app(app)
+
     return app
\ No newline at end of file
@@ -0,0 +1,144 @@
+import io
+import logging
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.image_store import EXTENSIONS, is_valid_key
+
+logger = logging.getLogger(__name__)
+
+# De formaten die de templates gebruiken (chat: 32, posts: 70, profiel: 256)
+AVATAR_SIZES = (32, 70, 256)
+# Formaten per variant; WebP voor browsers, JPEG als fallback
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+# Het bewaarde 'origineel' wordt hierop begrensd
+MAX_ORIGINAL_SIZE = 1024
+# Beschermt tegen decompression bombs (bijv. 1 kB PNG van 50000x50000)
+MAX_PIXELS = 25_000_000
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def nearest_size(size, sizes=AVATAR_SIZES):
+    """Het kleinste voorgerenderde formaat dat minstens `size` is (anders het grootste)."""
+    for candidate in sorted(sizes):
+        if candidate >= size:
+            return candidate
+    return max(sizes)
+
+
+def variant_key(key, size, ext='webp'):
+    """Sleutel van een thumbnail; afgeleid van de (content-addressed) sleutel van het origineel."""
+    return f'{key.rsplit(".", 1)[0]}-{size}.{ext}'
+
+
+def parse_variant_key(key):
+    """
+    (digest, formaat, extensie) van een thumbnail-sleutel, of None als het
+    geen variant is die we renderen (onbekend formaat of extensie).
+    """
+    stem, _, ext = key.rpartition('.')
+    digest, _, size = stem.rpartition('-')
+    if not digest or ext not in VARIANT_FORMATS or not size.isdigit() or int(size) not in AVATAR_SIZES:
+        return None
+    return digest, int(size), ext
+
+
+def original_keys(key):
+    """Mogelijke sleutels van het origineel bij een variant-sleutel."""
+    digest = key.rsplit('.', 1)[0].rsplit('-', 1)[0]
+    return [f'{digest}.{ext}' for ext in EXTENSIONS.values()]
+
+
+def _check_size(image):
+    # Image.open leest alleen de header: weiger te grote afbeeldingen voordat er
+    # iets gedecodeerd wordt. Pillow zelf weigert pas boven 2x MAX_IMAGE_PIXELS.
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise InvalidImage(f'Afbeelding te groot: {width}x{height} pixels')
+
+
+def _open(stream):
+    try:
+        # verify() controleert het hele bestand, maar daarna moet het opnieuw geopend worden
+        with Image.open(stream) as probe:
+            _check_size(probe)
+            probe.verify()
+        stream.seek(0)
+        image = Image.open(stream)
+        _check_size(image)
+        if image.format == 'JPEG':
+            # Decodeer een grote JPEG direct op (ongeveer) het formaat dat we bewaren
+            image.draft('RGB', (MAX_ORIGINAL_SIZE, MAX_ORIGINAL_SIZE))
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImage(str(e)) from e
+    if image.format not in ('JPEG', 'PNG', 'GIF', 'WEBP'):
+        raise InvalidImage(f'Niet-ondersteund formaat: {image.format}')
+    # Draai volgens EXIF, daarna gooien we alle metadata weg
+    image = ImageOps.exif_transpose(image)
+    return image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+
+
+def _encode(image, fmt):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    options = {'PNG': {'optimize': True},
+               'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+               'WEBP': {'quality': 80, 'method': 4}}[fmt]
+    buffer = io.BytesIO()
+    # Zonder exif=/icc_profile= schrijft Pillow geen metadata mee
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def _render_variants(store, key, image):
+    for size in AVATAR_SIZES:
+        # Alleen wat nog ontbreekt: schalen en encoderen is het dure deel
+        missing = [(ext, fmt) for ext, fmt in VARIANT_FORMATS.items()
+                   if not store.exists(variant_key(key, size, ext))]
+        if not missing:
+            continue
+        thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for ext, fmt in missing:
+            store.save_as(variant_key(key, size, ext), _encode(thumb, fmt))
+
+
+def process_upload(store, stream):
+    """
+    Valideer een geüploade foto (een bestandsobject, bijv. de gespoolde
+    upload), strip de metadata (EXIF met bijv. GPS) en sla een begrensd
+    origineel plus alle thumbnails op. Geeft (sleutel, mimetype) terug;
+    gooit InvalidImage als het geen bruikbare afbeelding is.
+    """
+    image = _open(stream)
+    image.thumbnail((MAX_ORIGINAL_SIZE, MAX_ORIGINAL_SIZE), Image.LANCZOS)
+    mimetype = 'image/png' if image.mode == 'RGBA' else 'image/jpeg'
+    key = store.save(_encode(image, 'PNG' if mimetype == 'image/png' else 'JPEG'), mimetype)
+    _render_variants(store, key, image)
+    return key, mimetype
+
+
+def ensure_variant(store, key):
+    """
+    Render de thumbnails alsnog als een variant ontbreekt (bijv. voor foto's
+    van vóór deze pipeline). Geeft True terug als `key` daarna bestaat.
+    """
+    # Eerst de sleutel: een onbekend formaat of extensie kan nooit bestaan,
+    # en mag het origineel dus ook niet laten decoderen (de route is publiek)
+    if parse_variant_key(key) is None:
+        return False
+    for original in original_keys(key):
+        if is_valid_key(original) and store.exists(original):
+            try:
+                with open(store.path(original), 'rb') as f:
+                    _render_variants(store, original, _open(f))
+            except InvalidImage as e:
+                logger.warning("Kan geen thumbnails maken van %s: %s", original, e)
+                return False
+            return store.exists(key)
+    return False
@@ -2,48 +2,25 @@ from flask import Blueprint, redirect, url_for, session, request, render_templat
 from app import db, oauth
 from app.models import User, CalendarCredentials, Membership, Family
 from app.calendar_service import GoogleCalendarService
+from app.event_store import event_store
+from app.identity import get_current_user
+from app.calendar_credentials import get_calendar_credentials, credentials_manager
 import sqlalchemy as sa
 from datetime import datetime, timedelta
 import json
 from functools import wraps
 import logging
 
-logger = logging
+logger = logging.getLogger(__name__)
 
 # Maak een Blueprint voor kalendergerelateerde routes
 bp = Blueprint('calendar', __name__)
 
-# Helperfuncties voor credentialbeheer
-def get_calendar_credentials(user_id):
-    # Zoek de referenties in de database op basis van de gebruikers-ID
-    return db.session.scalar(
-        sa.select(CalendarCredentials).where(CalendarCredentials.user_id == user_id)
-    )
-
-# Helperfunctie om referenties om te zetten naar een dictionary
-def credentials_to_dict(creds):
-    logger = logging.getLogger(__name__)
-    logger.debug("Omzetten van referenties naar dictionary")
-    if not creds:
-        logger.warning("Geen referenties gevonden")
-        return None
-    # Maak een dictionary met de referentiegegevens
-    return {
-        'token': creds.token,
-        'refresh_token': creds.refresh_token,
-        'token_uri': creds.token_uri,
-        'client_id': creds.client_id,
-        'client_secret': creds.client_secret,
-        'scopes': json.loads(creds.scopes),
-        'expiry': creds.expiry.isoformat() if creds.expiry else None
-    }
-
 # Decorators
 def login_required(f):
     @wraps(f)
     # Behoud de metadata van de originele functie
     def decorated_function(*args, **kwargs):
-        logger = logging.getLogger(__name__)
         if 'user' not in session:
             logger.warning("Geen gebruiker in sessie, redirect naar login")
             return redirect(url_for('login'))
@@ -54,7 +31,6 @@ def calendar_auth_required(f):
     @wraps(f)
     # Behoud de metadata van de originele functie
     def decorated_function(*args, **kwargs):
-        logger = logging.getLogger(__name__)
         current_user = get_current_user()
         if not current_user:
             logger.warning("Geen huidige gebruiker, redirect naar login")
@@ -68,24 +44,6 @@ def calendar_auth_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Hulpfunction om de huidige gebruiker op te halen
-def get_current_user():
-    logger = logging.getLogger(__name__)
-    user_info = session.get('user', {}).get('userinfo', {})
-    current_app.logger.debug(f"User info: {user_info}")
-    if not user_info:
-        return None
-    sub = user_info.get('sub')
-    if not sub:
-        current_app.logger.error("No sub found in user info, cannot retrieve user")
-        return None
-    user = db.session.scalar(sa.select(User).where(User.sub == sub))
-    if user:
-        current_app.logger.debug(f"Found user with sub: {sub}")
-    else:
-        current_app.logger.debug("User not found in database, should have been created in callback")
-    return user
-
 # Routes
 @bp.route('/calendar')
 @login_required  # Vereist dat de gebruiker is ingelogd
@@ -117,11 +75,9 @@ def authorize():
 @bp.route('/create_event', methods=['POST'])
 @calendar_auth_required
 def create_event():
-    logger = logging.getLogger(__name__)
     current_user = get_current_user()
-    creds = get_calendar_credentials(current_user.id)
-    creds_dict = credentials_to_dict(creds)
-    if not creds_dict:
+    credentials = credentials_manager.get(current_user.id)
+    if not credentials:
         logger.warning("Geen referenties voor huidige gebruiker")
         return jsonify({'error': 'Google Calendar niet geautoriseerd'}), 401
 
@@ -131,7 +87,7 @@ def create_event():
         return jsonify({'error': 'Ongeldige gegevens'}), 400
 
     try:
-        service = GoogleCalendarService.get_calendar_service(creds_dict)
+        service = GoogleCalendarService.get_calendar_service(credentials)
         event = GoogleCalendarService.create_event(
             service,
             calendar_id='primary',
@@ -142,7 +98,8 @@ def create_event():
             location=data.get('location', ''),
             attendees=data.get('attendees', [])  # Inclusief familieleden en extra genodigden
         )
-        logger.info(f"Evenement aangemaakt met ID: {event.get('id')}")
+        logger.info("Evenement aangemaakt met ID: %s", event.get('id'))
+        event_store.patch_event(current_user.id, 'primary', event=event)
         return jsonify({
             'id': event['id'],
             'title': event['summary'],
@@ -153,7 +110,7 @@ def create_event():
             'attendees': [attendee['email'] for attendee in event.get('attendees', [])]
         }), 201
     except Exception as e:
-        logger.error(f"Fout bij aanmaken evenement: {e}")
+        logger.error("Fout bij aanmaken evenement: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -161,7 +118,6 @@ def create_event():
 @login_required
 def family_members():
     from app import db
-    logger = logging.getLogger(__name__)
     current_user = get_current_user()
 
     try:
@@ -182,10 +138,10 @@ def family_members():
             {'username': member.username, 'email': member.email}
             for member in members
         ]
-        logger.debug(f"Ophalen familieleden: {len(family_members)} leden gevonden")
+        logger.debug("Ophalen familieleden: %d leden gevonden", len(family_members))
         return jsonify(family_members)
     except Exception as e:
-        logger.error(f"Fout bij ophalen familieleden: {e}")
+        logger.error("Fout bij ophalen familieleden: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/oauth2callback')
@@ -223,6 +179,7 @@ def google_oauth2callback():
         db.session.add(creds)
 
     db.session.commit()
+    credentials_manager.forget(current_user.id)
     flash('Google Calendar connected successfully!')
     return redirect(url_for('calendar.index'))
 
@@ -230,12 +187,10 @@ def google_oauth2callback():
 @calendar_auth_required
 def events():
     current_user = get_current_user()
-    creds = get_calendar_credentials(current_user.id)
-    creds_dict = credentials_to_dict(creds)
-    if not creds_dict:
+    credentials = credentials_manager.get(current_user.id)
+    if not credentials:
         return redirect(url_for('calendar.authorize'))
 
-    service = GoogleCalendarService.get_calendar_service(creds_dict)
     start_date = request.args.get('start')
     end_date = request.args.get('end')
     family_id = request.args.get('family_id')  # Optionele parameter voor specifieke familie
@@ -249,56 +204,63 @@ def events():
     else:
         end_date = start_date + timedelta(days=30)
 
-    # Haal evenementen van de huidige gebruiker op
-    user_events = GoogleCalendarService.get_events(
-        service,
+    # Haal in één query de familieleden (met referenties) uit de geselecteerde familie(s) op
+    my_families = sa.select(Membership.family_id).where(Membership.user_id == current_user.id)
+    if family_id:
+        my_families = my_families.where(Membership.family_id == int(family_id))
+    rows = db.session.execute(
+        sa.select(Family, User, CalendarCredentials)
+        .join(Membership, Membership.family_id == Family.id)
+        .join(User, User.id == Membership.user_id)
+        .join(CalendarCredentials, CalendarCredentials.user_id == User.id)
+        .where(Family.id.in_(my_families), Membership.user_id != current_user.id)
+        .order_by(Family.id, Membership.id)
+    ).all()
+
+    # Elk lid wordt één keer opgehaald; events horen bij de eerste familie waarin het lid voorkomt
+    members = {}
+    credentials_by_key = {current_user.id: credentials}
+    for family, member, member_creds in rows:
+        if member.id in members:
+            continue
+        members[member.id] = (member, family)
+        try:
+            # Uit de cache; alleen bij een (bijna) verlopen token een refresh die wordt opgeslagen
+            credentials_by_key[member.id] = credentials_manager.get(member.id, row=member_creds)
+        except Exception as e:
+            current_app.logger.error(
+                "Fout bij verversen referenties voor familielid %s in familie %s: %s", member.username, family.name, e)
+            del members[member.id]
+
+    # Haal alle agenda's (eigen + familieleden) parallel op, via de lokale event-store
+    results, errors = GoogleCalendarService.get_events_concurrently(
+        credentials_by_key,
         time_min=start_date,
         time_max=end_date,
-        max_results=100
+        max_results=100,
+        timeout=current_app.config['CALENDAR_FETCH_TIMEOUT'],
+        max_workers=current_app.config['CALENDAR_FANOUT_WORKERS'],
+        store=event_store
     )
+    if current_user.id in errors:
+        # Net als voorheen: een fout in de eigen agenda is fataal voor het request
+        raise errors[current_user.id]
+    user_events = results[current_user.id]
 
-    # Haal familieleden op uit de geselecteerde familie(s)
     family_events = []
-    query = sa.select(Family).join(Membership).where(Membership.user_id == current_user.id)
-    if family_id:
-        query = query.where(Family.id == int(family_id))
-
-    families = db.session.scalars(query).all()
-
-    for family in families:
-        # Haal alle leden van de familie op (exclusief de huidige gebruiker)
-        members = db.session.scalars(
-            sa.select(User)
-            .join(Membership)
-            .where(Membership.family_id == family.id, Membership.user_id != current_user.id)
-        ).all()
-
-        for member in members:
-            member_creds = db.session.scalar(
-                sa.select(CalendarCredentials).where(CalendarCredentials.user_id == member.id)
-            )
-            if member_creds:
-                member_creds_dict = credentials_to_dict(member_creds)
-                if member_creds_dict:
-                    try:
-                        member_service = GoogleCalendarService.get_calendar_service(member_creds_dict)
-                        events = GoogleCalendarService.get_events(
-                            member_service,
-                            time_min=start_date,
-                            time_max=end_date,
-                            max_results=100
-                        )
-                        # Voeg metadata toe om de gebruiker en familie te identificeren
-                        for event in events:
-                            event['creator_id'] = member.id
-                            event['creator_username'] = member.username
-                            event['family_member_name'] = member.username
-                            event['family_name'] = family.name
-                            family_events.append(event)
-                    except Exception as e:
-                        current_app.logger.error(
-                            f"Fout bij ophalen evenementen voor familielid {member.username} in familie {family.name}: {e}")
-                        continue
+    for member_id, (member, family) in members.items():
+        if member_id in errors:
+            current_app.logger.error(
+                "Fout bij ophalen evenementen voor familielid %s in familie %s: %s",
+                member.username, family.name, errors[member_id])
+            continue
+        # Voeg metadata toe om de gebruiker en familie te identificeren
+        for event in results[member_id]:
+            event['creator_id'] = member.id
+            event['creator_username'] = member.username
+            event['family_member_name'] = member.username
+            event['family_name'] = family.name
+            family_events.append(event)
 
     # Combineer en formatteer evenementen
     added_event_ids = set()
@@ -334,23 +296,21 @@ def events():
 @bp.route('/calendar/event/<event_id>', methods=['PUT'])
 @calendar_auth_required
 def update_event(event_id):
-    logger = logging.getLogger(__name__)
     current_user = get_current_user()
-    creds = get_calendar_credentials(current_user.id)
-    creds_dict = credentials_to_dict(creds)
+    credentials = credentials_manager.get(current_user.id)
 
-    if not creds_dict:
+    if not credentials:
         logger.warning("Geen referenties voor huidige gebruiker")
         return jsonify({'error': 'Google Calendar niet geautoriseerd'}), 401
 
     try:
-        service = GoogleCalendarService.get_calendar_service(creds_dict)
+        service = GoogleCalendarService.get_calendar_service(credentials)
         event = service.events().get(calendarId='primary', eventId=event_id).execute()
 
         # Controleer of de huidige gebruiker de maker is
         creator_email = event.get('creator', {}).get('email')
         if creator_email != current_user.email:
-            logger.warning(f"Gebruiker {current_user.username} probeerde een evenement te bewerken dat niet van hen is: {event_id}")
+            logger.warning("Gebruiker %s probeerde een evenement te bewerken dat niet van hen is: %s", current_user.username, event_id)
             return jsonify({'error': 'Je kunt alleen je eigen evenementen bewerken'}), 403
 
         # Update velden
@@ -384,7 +344,8 @@ def update_event(event_id):
             event
         )
 
-        logger.info(f"Evenement {event_id} succesvol bijgewerkt door {current_user.username}")
+        event_store.patch_event(current_user.id, 'primary', event=updated_event)
+        logger.info("Evenement %s succesvol bijgewerkt door %s", event_id, current_user.username)
         return jsonify({
             'id': updated_event['id'],
             'title': updated_event['summary'],
@@ -393,7 +354,7 @@ def update_event(event_id):
         })
 
     except Exception as e:
-        logger.error(f"Fout bij bewerken evenement {event_id}: {e}")
+        logger.error("Fout bij bewerken evenement %s: %s", event_id, e)
         return jsonify({'error': str(e)}), 500
 
 
@@ -401,30 +362,35 @@ def update_event(event_id):
 @bp.route('/calendar/event/<event_id>', methods=['DELETE'])
 @calendar_auth_required
 def delete_event(event_id):
-    logger = logging.getLogger(__name__)
     current_user = get_current_user()
-    creds = get_calendar_credentials(current_user.id)
-    creds_dict = credentials_to_dict(creds)
+    credentials = credentials_manager.get(current_user.id)
 
-    if not creds_dict:
+    if not credentials:
         logger.warning("Geen referenties voor huidige gebruiker")
         return jsonify({'error': 'Google Calendar niet geautoriseerd'}), 401
 
     try:
-        service = GoogleCalendarService.get_calendar_service(creds_dict)
+        service = GoogleCalendarService.get_calendar_service(credentials)
         event = service.events().get(calendarId='primary', eventId=event_id).execute()
 
         # Controleer of de huidige gebruiker de maker is
         creator_email = event.get('creator', {}).get('email')
         if creator_email != current_user.email:
-            logger.warning(f"Gebruiker {current_user.username} probeerde een evenement te verwijderen dat niet van hen is: {event_id}")
+            logger.warning("Gebruiker %s probeerde een evenement te verwijderen dat niet van hen is: %s", current_user.username, event_id)
             return jsonify({'error': 'Je kunt alleen je eigen evenementen verwijderen'}), 403
 
         # Verwijder het evenement
         GoogleCalendarService.delete_event(service, 'primary', event_id)
-        logger.info(f"Evenement {event_id} succesvol verwijderd door {current_user.username}")
+        event_store.patch_event(current_user.id, 'primary', deleted_id=event_id)
+        logger.info("Evenement %s succesvol verwijderd door %s", event_id, current_user.username)
         return jsonify({'success': True})
 
     except Exception as e:
-        logger.error(f"Fout bij verwijderen evenement {event_id}: {e}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        logger.error("Fout bij verwijderen evenement %s: %s", event_id, e)
+        return jsonify({'error': str(e)}), 500
+
+# CLI: start de periodieke tokenverversing (draai een worker met --with-scheduler)
+@bp.cli.command('refresh-tokens')
+def refresh_tokens_command():
+    job = current_app.task_queue.enqueue('app.tasks.refresh_calendar_tokens')
+    print(f"Tokenverversing ingepland (job {job.id})")
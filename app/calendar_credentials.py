@@ -0,0 +1,201 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from google.auth.transport.requests import Request
+from flask import g, has_request_context
+from google.oauth2.credentials import Credentials
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models import CalendarCredentials
+from app.metrics import cache_lookup, observe_google_call
+
+logger = logging.getLogger(__name__)
+
+
+# Helperfuncties voor credentialbeheer
+def get_calendar_credentials(user_id):
+    # Zoek de referenties in de database op basis van de gebruikers-ID
+    return db.session.scalar(
+        sa.select(CalendarCredentials).where(CalendarCredentials.user_id == user_id)
+    )
+
+
+# Helperfunctie om referenties om te zetten naar een dictionary
+def credentials_to_dict(creds):
+    logger.debug("Omzetten van referenties naar dictionary")
+    if not creds:
+        logger.warning("Geen referenties gevonden")
+        return None
+    # Maak een dictionary met de referentiegegevens
+    return {
+        'token': creds.token,
+        'refresh_token': creds.refresh_token,
+        'token_uri': creds.token_uri,
+        'client_id': creds.client_id,
+        'client_secret': creds.client_secret,
+        'scopes': json.loads(creds.scopes),
+        'expiry': creds.expiry.isoformat() if creds.expiry else None
+    }
+
+
+def _utcnow():
+    # google-auth werkt met naive UTC-tijden voor expiry
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class CredentialsManager:
+    """
+    Levert Google Credentials per gebruiker en houdt ze in leven:
+    - hergebruikt ze (per proces) zolang ze niet bijna verlopen zijn;
+    - ververst een bijna verlopen token maar één keer tegelijk per gebruiker
+      (single-flight), ook als meerdere requests er tegelijk om vragen;
+    - schrijft een ververste token en expiry terug naar CalendarCredentials,
+      ook als google-auth zelf ververst tijdens een API-call (bij de volgende
+      get en aan het eind van het request).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._user_locks = {}
+        # (token, expiry) zoals wij ze in de database kennen, per gebruiker
+        self._stored = {}
+        self.refresh_margin = timedelta(minutes=5)
+
+    def init_app(self, app):
+        self.refresh_margin = timedelta(seconds=app.config['CALENDAR_TOKEN_REFRESH_MARGIN'])
+        app.teardown_request(self._sync_request)
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _expiring(self, credentials, margin):
+        if credentials.expiry is None:
+            return not credentials.valid
+        return credentials.expiry - margin <= _utcnow()
+
+    def get(self, user_id, row=None, margin=None):
+        """
+        Geldige Credentials voor `user_id`, of None zonder gekoppelde agenda.
+        Geef `row` mee als de CalendarCredentials al geladen zijn.
+        """
+        margin = self.refresh_margin if margin is None else margin
+        if has_request_context():
+            g.setdefault('calendar_credentials_used', set()).add(user_id)
+        with self._lock:
+            credentials = self._cache.get(user_id)
+        if credentials is not None and not self._expiring(credentials, margin):
+            cache_lookup('calendar_credentials', 'hit')
+            self._sync_back(user_id, credentials, row)
+            return credentials
+        cache_lookup('calendar_credentials', 'stale' if credentials is not None else 'miss')
+
+        with self._user_lock(user_id):
+            # Misschien heeft een ander request het token net ververst
+            with self._lock:
+                credentials = self._cache.get(user_id)
+            if credentials is not None and not self._expiring(credentials, margin):
+                return credentials
+
+            if row is None:
+                row = get_calendar_credentials(user_id)
+            else:
+                # Lees opnieuw: een andere worker kan het token al ververst hebben
+                db.session.refresh(row)
+            if row is None:
+                self.forget(user_id)
+                return None
+
+            credentials = Credentials.from_authorized_user_info(credentials_to_dict(row))
+            # Zoals het in de database staat (expiry in de vorm van google-auth)
+            self._remember(user_id, credentials.token, credentials.expiry)
+            if self._expiring(credentials, margin) and credentials.refresh_token:
+                logger.info("Token van gebruiker %s verversen (verloopt %s)", user_id, credentials.expiry)
+                started, outcome = time.perf_counter(), 'error'
+                try:
+                    credentials.refresh(Request())
+                    outcome = 'ok'
+                finally:
+                    observe_google_call('oauth2.token.refresh', started, outcome)
+                self._persist(user_id, credentials, row)
+
+            with self._lock:
+                self._cache[user_id] = credentials
+            return credentials
+
+    def _remember(self, user_id, token, expiry):
+        with self._lock:
+            self._stored[user_id] = (token, expiry)
+
+    def _sync_back(self, user_id, credentials, row=None):
+        # google-auth kan tijdens een API-call zelf verversen; bewaar dat resultaat ook
+        with self._lock:
+            stored = self._stored.get(user_id)
+        if stored != (credentials.token, credentials.expiry):
+            self._persist(user_id, credentials, row)
+
+    def _sync_request(self, exc=None):
+        # Aan het eind van het request: wat google-auth onderweg heeft ververst
+        for user_id in g.pop('calendar_credentials_used', ()):
+            with self._lock:
+                credentials = self._cache.get(user_id)
+            if credentials is None:
+                continue
+            try:
+                self._sync_back(user_id, credentials)
+            except Exception as e:
+                logger.warning("Kon ververst token van gebruiker %s niet bewaren: %s", user_id, e)
+
+    def _persist(self, user_id, credentials, row=None):
+        update = (sa.update(CalendarCredentials)
+                  .where(CalendarCredentials.user_id == user_id)
+                  .values(token=credentials.token, expiry=credentials.expiry))
+        if credentials.expiry is not None:
+            # Niet over een nieuwer token van een andere worker heen schrijven
+            update = update.where(sa.or_(CalendarCredentials.expiry.is_(None),
+                                         CalendarCredentials.expiry < credentials.expiry))
+        # Eigen verbinding: de transactie van het lopende request blijft onaangeroerd
+        with db.engine.begin() as conn:
+            conn.execute(update)
+        self._remember(user_id, credentials.token, credentials.expiry)
+        if row is not None:
+            set_committed_value(row, 'token', credentials.token)
+            set_committed_value(row, 'expiry', credentials.expiry)
+
+    def forget(self, user_id):
+        with self._lock:
+            self._cache.pop(user_id, None)
+            self._stored.pop(user_id, None)
+
+    def refresh_expiring(self, lookahead, limit=100):
+        """
+        Ververs alle tokens die binnen `lookahead` verlopen (voor de achtergrondjob).
+        Al verlopen tokens laten we liggen: die worden bij gebruik ververst, en
+        zo blijft een ingetrokken token niet elke ronde terugkomen.
+        Retourneert het aantal tokens dat daarna geldig is.
+        """
+        now = _utcnow()
+        rows = db.session.scalars(
+            sa.select(CalendarCredentials)
+            .where(CalendarCredentials.expiry > now,
+                   CalendarCredentials.expiry <= now + lookahead)
+            .order_by(CalendarCredentials.expiry)
+            .limit(limit)
+        ).all()
+        valid = 0
+        for row in rows:
+            try:
+                if self.get(row.user_id, row=row, margin=lookahead) is not None:
+                    valid += 1
+            except Exception as e:
+                logger.error("Kon token van gebruiker %s niet verversen: %s", row.user_id, e)
+        return valid
+
+
+credentials_manager = CredentialsManager()
@@ -1,30 +1,148 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from google_auth_httplib2 import AuthorizedHttp
 from flask import url_for, current_app
 from google_auth_oauthlib.flow import Flow
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, wait
+import httplib2
+import json
+import queue
+import threading
 import logging
 
+from app.metrics import MeteredHttpRequest
+
+logger = logging.getLogger(__name__)
+
+# Gedeelde, begrensde threadpool voor het parallel ophalen van agenda's
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(max_workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix='calendar-fetch'
+                )
+    return _executor
+
+
+# Het geparste discovery-document, één keer per proces. googleapiclient vult
+# bij het bouwen van een resource de parameters van elke methode aan (in het
+# document zelf); dat doen we één keer onder een lock voor álle resources,
+# daarna overschrijft een build alleen nog bestaande sleutels met dezelfde
+# waarden en kunnen threads en greenlets het document veilig delen.
+_discovery_doc = None
+_discovery_lock = threading.Lock()
+
+
+def _prepare_resources(resource, description):
+    # Elke (geneste) resource één keer aanmaken, zodat al zijn methoden zijn aangevuld
+    for name, nested in description.get('resources', {}).items():
+        _prepare_resources(getattr(resource, name)(), nested)
+
+
+def _calendar_discovery_doc():
+    global _discovery_doc
+    if _discovery_doc is None:
+        with _discovery_lock:
+            if _discovery_doc is None:
+                # Statisch document uit het pakket: geen HTTP-call en maar één keer parsen
+                doc = json.loads(get_static_doc('calendar', 'v3'))
+                _prepare_resources(build_from_document(doc, http=httplib2.Http()), doc)
+                _discovery_doc = doc
+    return _discovery_doc
+
+
+class _HttpPool:
+    """
+    Begrensde pool van keep-alive httplib2.Http-objecten. Een Http is niet
+    thread-safe, dus elke request leent er één en geeft hem daarna terug.
+    Is de pool leeg, dan komt er een nieuwe bij; zijn er al `size` vrij,
+    dan wordt de teruggegeven Http gesloten. Zo houdt een proces hooguit
+    `size` ongebruikte verbindingen open, hoeveel greenlets of threads er
+    ook tegelijk een call doen.
+    """
+
+    def __init__(self, size=10):
+        self.size = size
+        self._idle = queue.LifoQueue()
+
+    def checkout(self, timeout):
+        try:
+            http = self._idle.get_nowait()
+        except queue.Empty:
+            return httplib2.Http(timeout=timeout)
+        http.timeout = timeout
+        return http
+
+    def checkin(self, http):
+        if self._idle.qsize() < self.size:
+            self._idle.put(http)
+        else:
+            http.close()
+
+
+_http_pool = _HttpPool()
+
+
+class _PooledHttp:
+    """Http-achtig object voor AuthorizedHttp: leent per request een Http uit de pool."""
+
+    def __init__(self, pool, timeout):
+        self.pool = pool
+        self.timeout = timeout
+        self.follow_redirects = True
+        self.redirect_codes = httplib2.REDIRECT_CODES
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        http = self.pool.checkout(self.timeout)
+        try:
+            response = http.request(uri, method=method, body=body, headers=headers, **kwargs)
+        except Exception:
+            # Verbinding in onbekende staat: niet teruggeven aan de pool
+            http.close()
+            raise
+        self.pool.checkin(http)
+        return response
+
+    def close(self):
+        # De verbindingen zijn van de pool, niet van deze service
+        pass
+
+
 # Klasse om interacties met de Google Calendar API te beheren
 class GoogleCalendarService:
+    # Timeout (seconden) voor HTTP-calls naar Google; ingesteld vanuit de config
+    http_timeout = 30
+
     # Statische methode om een Google Calendar-service te initialiseren
     @staticmethod
-    def get_calendar_service(credentials_dict):
-        logger = logging.getLogger(__name__)
+    def get_calendar_service(credentials):
         logger.debug("Initialiseren van Google Calendar-service met referenties")
         try:
-            # Converteer de referenties naar een Credentials-object
-            credentials = Credentials.from_authorized_user_info(credentials_dict)
-            # Maak een Google Calendar-service (versie 'v3') met de referenties
-            return build('calendar', 'v3', credentials=credentials)
+            # Converteer de referenties zo nodig naar een Credentials-object
+            # (app.calendar_credentials levert ze al kant-en-klaar en gecachet aan)
+            if isinstance(credentials, dict):
+                credentials = Credentials.from_authorized_user_info(credentials)
+            # Maak een Google Calendar-service (versie 'v3') op het gecachete discovery-document,
+            # met keep-alive verbindingen uit de gedeelde pool
+            http = AuthorizedHttp(credentials, http=_PooledHttp(_http_pool, GoogleCalendarService.http_timeout))
+            return build_from_document(
+                _calendar_discovery_doc(), http=http, requestBuilder=MeteredHttpRequest
+            )
         except Exception as e:
-            logger.error(f"Fout bij het bouwen van de calendar-service: {e}")
+            logger.error("Fout bij het bouwen van de calendar-service: %s", e)
             raise
 
     # Statische methode om een OAuth2-flow te maken voor authenticatie
     @staticmethod
     def create_flow(redirect_uri=None):
-        logger = logging.getLogger(__name__)
         logger.debug("Aanmaken van OAuth2-flow voor authenticatie")
         # Definieer de clientconfiguratie voor OAuth2
         client_config = {
@@ -54,44 +172,42 @@ class GoogleCalendarService:
     # Statische methode om een lijst van kalenders op te halen
     @staticmethod
     def get_calendar_list(service):
-        logger = logging.getLogger(__name__)
         logger.debug("Ophalen van lijst met kalenders")
         try:
             return service.calendarList().list().execute()
         except Exception as e:
-            logger.error(f"Fout bij het ophalen van kalenderlijst: {e}")
+            logger.error("Fout bij het ophalen van kalenderlijst: %s", e)
             raise
 
     # Statische methode om evenementen op te halen uit een kalender
     @staticmethod
     def get_events(service, calendar_id='primary', time_min=None, time_max=None, max_results=10):
-        logger = logging.getLogger(__name__)
-        logger.debug(f"Ophalen van evenementen voor kalender {calendar_id}, time_min: {time_min}, time_max: {time_max}")
+        logger.debug("Ophalen van evenementen voor kalender %s, time_min: %s, time_max: %s", calendar_id, time_min, time_max)
         try:
             # Converteer time_min en time_max naar datetime indien strings
             if isinstance(time_min, str):
                 try:
                     time_min = datetime.fromisoformat(time_min.rstrip('Z').replace('Z', '+00:00'))
-                    logger.debug(f"Geconverteerde time_min: {time_min}")
+                    logger.debug("Geconverteerde time_min: %s", time_min)
                 except ValueError as e:
-                    logger.error(f"Ongeldig time_min formaat: {time_min}, fout: {e}")
+                    logger.error("Ongeldig time_min formaat: %s, fout: %s", time_min, e)
                     raise ValueError(f"Ongeldig time_min formaat: {time_min}")
             if isinstance(time_max, str):
                 try:
                     time_max = datetime.fromisoformat(time_max.rstrip('Z').replace('Z', '+00:00'))
-                    logger.debug(f"Geconverteerde time_max: {time_max}")
+                    logger.debug("Geconverteerde time_max: %s", time_max)
                 except ValueError as e:
-                    logger.error(f"Ongeldig time_max formaat: {time_max}, fout: {e}")
+                    logger.error("Ongeldig time_max formaat: %s, fout: %s", time_max, e)
                     raise ValueError(f"Ongeldig time_max formaat: {time_max}")
 
             # Stel standaard starttijd in op nu als niet opgegeven
             if not time_min:
                 time_min = datetime.utcnow()
-                logger.debug(f"Standaard time_min ingesteld op: {time_min}")
+                logger.debug("Standaard time_min ingesteld op: %s", time_min)
             # Stel standaard eindtijd in op 30 dagen vanaf start als niet opgegeven
             if not time_max:
                 time_max = time_min + timedelta(days=30)
-                logger.debug(f"Standaard time_max ingesteld op: {time_max}")
+                logger.debug("Standaard time_max ingesteld op: %s", time_max)
 
             # Haal evenementen op uit de kalender met de opgegeven parameters
             events_result = service.events().list(
@@ -104,36 +220,141 @@ class GoogleCalendarService:
             ).execute()
 
             events = events_result.get('items', [])
-            logger.info(f"{len(events)} evenementen opgehaald uit kalender {calendar_id}")
-            logger.debug(f"Ruwe evenementen: {events}")
+            logger.info("%d evenementen opgehaald uit kalender %s", len(events), calendar_id)
+            logger.debug("Ruwe evenementen: %s", events)
             return events
         except Exception as e:
-            logger.error(f"Fout bij het ophalen van evenementen: {e}")
+            logger.error("Fout bij het ophalen van evenementen: %s", e)
             raise
 
+    # Statische methode om alle (gewijzigde) evenementen in een tijdvenster op te halen
+    @staticmethod
+    def list_event_window(service, time_min, time_max, calendar_id='primary', updated_min=None):
+        """
+        Haalt alle evenementen in [time_min, time_max) op, over alle pagina's.
+        Met `updated_min` alleen wat sindsdien is gewijzigd, inclusief
+        verwijderde evenementen (status 'cancelled').
+        """
+        params = {
+            'calendarId': calendar_id,
+            'timeMin': time_min.astimezone(timezone.utc).isoformat(),
+            'timeMax': time_max.astimezone(timezone.utc).isoformat(),
+            'singleEvents': True,
+            'maxResults': 250,
+        }
+        if updated_min is not None:
+            params['updatedMin'] = updated_min.astimezone(timezone.utc).isoformat()
+            params['showDeleted'] = True
+        items = GoogleCalendarService._list_all_pages(service, params)
+        logger.info("%d evenementen opgehaald uit kalender %s (updatedMin: %s)",
+                    len(items), calendar_id, updated_min)
+        return items
+
+    @staticmethod
+    def list_changed_events(service, updated_min, calendar_id='primary'):
+        """
+        Alle evenementen die sinds `updated_min` zijn gewijzigd, ongeacht
+        wanneer ze plaatsvinden. Herhalende evenementen komen als één reeks
+        terug (niet uitgeklapt), verwijderde met status 'cancelled'.
+        """
+        params = {
+            'calendarId': calendar_id,
+            'updatedMin': updated_min.astimezone(timezone.utc).isoformat(),
+            'showDeleted': True,
+            'maxResults': 250,
+        }
+        items = GoogleCalendarService._list_all_pages(service, params)
+        logger.info("%d gewijzigde evenementen in kalender %s sinds %s", len(items), calendar_id, updated_min)
+        return items
+
+    @staticmethod
+    def _list_all_pages(service, params):
+        try:
+            items = []
+            while True:
+                result = service.events().list(**params).execute()
+                items.extend(result.get('items', []))
+                page_token = result.get('nextPageToken')
+                if not page_token:
+                    break
+                params['pageToken'] = page_token
+            return items
+        except Exception as e:
+            logger.error("Fout bij het ophalen van evenementen: %s", e)
+            raise
+
+    # Statische methode om de evenementen van meerdere gebruikers parallel op te halen
+    @staticmethod
+    def get_events_concurrently(credentials_by_key, time_min=None, time_max=None, max_results=10,
+                                timeout=10, max_workers=8, store=None):
+        """
+        Haalt voor elke sleutel in `credentials_by_key` (bijv. een user-id) de
+        evenementen op, allemaal tegelijk. De totale wachttijd is daardoor die
+        van het traagste lid in plaats van de som.
+
+        Retourneert (results, errors): de evenementen per sleutel die op tijd
+        binnen waren, en de exception per sleutel die faalde of niet binnen
+        `timeout` seconden klaar was. Eén falend lid raakt de rest niet.
+        Met een `store` (zie app.event_store) wordt per sleutel uit de lokale
+        event-store gelezen en alleen het verschil bij Google opgevraagd.
+        """
+
+        def fetch(key, credentials):
+            if store is not None:
+                return store.get_events(
+                    key, 'primary', credentials,
+                    time_min=time_min, time_max=time_max, max_results=max_results
+                )
+            service = GoogleCalendarService.get_calendar_service(credentials)
+            return GoogleCalendarService.get_events(
+                service, time_min=time_min, time_max=time_max, max_results=max_results
+            )
+
+        executor = _get_executor(max_workers)
+        futures = {
+            executor.submit(fetch, key, credentials): key
+            for key, credentials in credentials_by_key.items()
+        }
+        done, not_done = wait(futures, timeout=timeout)
+
+        results, errors = {}, {}
+        for future in done:
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                errors[key] = e
+        for future in not_done:
+            # Een lopende HTTP-call kan niet worden afgebroken; we wachten er alleen niet meer op
+            future.cancel()
+            errors[futures[future]] = TimeoutError(
+                f"Geen antwoord van Google Calendar binnen {timeout} seconden"
+            )
+        logger.debug("Parallel opgehaald: %d gelukt, %d mislukt", len(results), len(errors))
+        return results, errors
+
     # Statische methode om een nieuw evenement aan te maken
     @staticmethod
     def create_event(service, calendar_id='primary', summary='', start_datetime=None,
                      end_datetime=None, description='', location='', attendees=None):
-        logger = logging.getLogger(__name__)
-        logger.debug(f"Aanmaken van evenement: summary={summary}, start={start_datetime}, end={end_datetime}")
+        logger.debug("Aanmaken van evenement: summary=%s, start=%s, end=%s", summary, start_datetime, end_datetime)
         try:
             # Converteer start_datetime en end_datetime indien strings
             if isinstance(start_datetime, str):
                 start_datetime = datetime.fromisoformat(start_datetime.rstrip('Z').replace('Z', '+00:00'))
-                logger.debug(f"Geconverteerde start_datetime: {start_datetime}")
+                logger.debug("Geconverteerde start_datetime: %s", start_datetime)
             if isinstance(end_datetime, str):
                 end_datetime = datetime.fromisoformat(end_datetime.rstrip('Z').replace('Z', '+00:00'))
-                logger.debug(f"Geconverteerde end_datetime: {end_datetime}")
+                logger.debug("Geconverteerde end_datetime: %s", end_datetime)
 
             # Stel standaard starttijd in op nu als niet opgegeven
             if not start_datetime:
                 start_datetime = datetime.utcnow()
-                logger.debug(f"Standaard start_datetime ingesteld op: {start_datetime}")
+                logger.debug("Standaard start_datetime ingesteld op: %s", start_datetime)
             # Stel standaard eindtijd in op 1 uur later als niet opgegeven
             if not end_datetime:
                 end_datetime = start_datetime + timedelta(hours=1)
-                logger.debug(f"Standaard end_datetime ingesteld op: {end_datetime}")
+                logger.debug("Standaard end_datetime ingesteld op: %s", end_datetime)
 
             # Maak een evenementobject aan met de opgegeven gegevens
             event = {
@@ -154,17 +375,16 @@ class GoogleCalendarService:
                 event['attendees'] = [{'email': email} for email in attendees]
             # Voeg het evenement toe aan de kalender en retourneer het resultaat
             created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
-            logger.info(f"Evenement aangemaakt met ID: {created_event.get('id')}")
+            logger.info("Evenement aangemaakt met ID: %s", created_event.get('id'))
             return created_event
         except Exception as e:
-            logger.error(f"Fout bij het aanmaken van evenement: {e}")
+            logger.error("Fout bij het aanmaken van evenement: %s", e)
             raise
 
     # Statische methode om een bestaand evenement te updaten
     @staticmethod
     def update_event(service, calendar_id, event_id, event_data):
-        logger = logging.getLogger(__name__)
-        logger.debug(f"Updaten van evenement ID: {event_id}")
+        logger.debug("Updaten van evenement ID: %s", event_id)
         try:
             # Update het evenement met de nieuwe gegevens
             updated_event = service.events().update(
@@ -172,41 +392,39 @@ class GoogleCalendarService:
                 eventId=event_id,
                 body=event_data
             ).execute()
-            logger.info(f"Evenement bijgewerkt met ID: {event_id}")
+            logger.info("Evenement bijgewerkt met ID: %s", event_id)
             return updated_event
         except Exception as e:
-            logger.error(f"Fout bij het updaten van evenement: {e}")
+            logger.error("Fout bij het updaten van evenement: %s", e)
             raise
 
     # Statische methode om een evenement te verwijderen
     @staticmethod
     def delete_event(service, calendar_id, event_id):
-        logger = logging.getLogger(__name__)
-        logger.debug(f"Verwijderen van evenement ID: {event_id}")
+        logger.debug("Verwijderen van evenement ID: %s", event_id)
         try:
             # Verwijder het evenement uit de kalender
             service.events().delete(
                 calendarId=calendar_id,
                 eventId=event_id
             ).execute()
-            logger.info(f"Evenement verwijderd met ID: {event_id}")
+            logger.info("Evenement verwijderd met ID: %s", event_id)
         except Exception as e:
-            logger.error(f"Fout bij het verwijderen van evenement: {e}")
+            logger.error("Fout bij het verwijderen van evenement: %s", e)
             raise
 
     # Statische methode om vrije/beschikbare tijden op te halen
     @staticmethod
     def get_free_busy(service, time_min, time_max, calendars):
-        logger = logging.getLogger(__name__)
-        logger.debug(f"Ophalen van vrije/beschikbare tijden voor kalenders: {calendars}")
+        logger.debug("Ophalen van vrije/beschikbare tijden voor kalenders: %s", calendars)
         try:
             # Converteer time_min en time_max naar datetime indien strings
             if isinstance(time_min, str):
                 time_min = datetime.fromisoformat(time_min.rstrip('Z').replace('Z', '+00:00'))
-                logger.debug(f"Geconverteerde time_min: {time_min}")
+                logger.debug("Geconverteerde time_min: %s", time_min)
             if isinstance(time_max, str):
                 time_max = datetime.fromisoformat(time_max.rstrip('Z').replace('Z', '+00:00'))
-                logger.debug(f"Geconverteerde time_max: {time_max}")
+                logger.debug("Geconverteerde time_max: %s", time_max)
 
             # Maak een verzoek voor vrije/beschikbare tijden
             body = {
@@ -218,5 +436,5 @@ class GoogleCalendarService:
             logger.info("Vrije/beschikbare tijden opgehaald")
             return result
         except Exception as e:
-            logger.error(f"Fout bij het ophalen van vrije/beschikbare tijden: {e}")
+            logger.error("Fout bij het ophalen van vrije/beschikbare tijden: %s", e)
             raise
\ No newline at end of file
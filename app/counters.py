@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def _repair(column, actual, label, batch_size):
+    """
+    Zet `column` van User op `actual` (een gecorreleerde subquery) waar ze
+    verschillen, per blok van `batch_size` gebruikers zodat geen enkele
+    transactie lang rijen vasthoudt. Geeft het aantal gerepareerde rijen.
+    """
+    from app.models import User
+    repaired = 0
+    last_id = 0
+    while True:
+        ids = db.session.scalars(
+            sa.select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        result = db.session.execute(
+            sa.update(User)
+            .where(User.id.in_(ids), column != actual)
+            .values({column: actual})
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        repaired += result.rowcount
+    if repaired:
+        logger.warning("%s: %d tellers gecorrigeerd", label, repaired)
+    return repaired
+
+
+def reconcile_unread_messages(batch_size=1000):
+    """Herstel User.unread_messages uit de berichten zelf (drift door races of handmatige wijzigingen)."""
+    from app.models import User, Message
+    actual = (
+        sa.select(sa.func.count(Message.id))
+        .where(
+            Message.recipient_id == User.id,
+            Message.timestamp > sa.func.coalesce(User.last_message_read_time, datetime(1900, 1, 1)),
+        )
+        .scalar_subquery()
+    )
+    return _repair(User.unread_messages, actual, 'unread_messages', batch_size)
+
+
+def reconcile_follow_counts(batch_size=1000):
+    """Herstel User.num_followers en User.num_following uit de followers-tabel."""
+    from app.models import User, followers
+    actual_followers = (
+        sa.select(sa.func.count()).where(followers.c.followed_id == User.id).scalar_subquery()
+    )
+    actual_following = (
+        sa.select(sa.func.count()).where(followers.c.follower_id == User.id).scalar_subquery()
+    )
+    return (
+        _repair(User.num_followers, actual_followers, 'num_followers', batch_size)
+        + _repair(User.num_following, actual_following, 'num_following', batch_size)
+    )
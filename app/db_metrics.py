@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool die bijhoudt hoe lang een checkout op een vrije verbinding
+    moet wachten (inclusief het openen van een nieuwe), zodat we workers en
+    pool-grootte kunnen afstemmen op max_connections van Postgres.
+    """
+
+    # Checkouts die langer wachten dan dit worden gelogd (seconden; None = nooit)
+    wait_warning = None
+
+    def _stats(self):
+        stats = self.__dict__.get('_wait_stats')
+        if stats is None:
+            stats = self.__dict__.setdefault('_wait_stats', {
+                'lock': threading.Lock(), 'checkouts': 0, 'wait_total': 0.0,
+                'wait_max': 0.0, 'timeouts': 0,
+            })
+        return stats
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            stats = self._stats()
+            with stats['lock']:
+                stats['timeouts'] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            stats = self._stats()
+            with stats['lock']:
+                stats['checkouts'] += 1
+                stats['wait_total'] += waited
+                stats['wait_max'] = max(stats['wait_max'], waited)
+            if self.wait_warning is not None and waited > self.wait_warning:
+                logger.warning("Wachtte %.0f ms op een DB-verbinding (%s)", waited * 1000, self.status())
+
+    def wait_stats(self):
+        stats = self._stats()
+        with stats['lock']:
+            return {key: value for key, value in stats.items() if key != 'lock'}
+
+
+def pool_status(engine):
+    """Huidige stand van de pool van `engine`, als dict (voor /healthz/db en metrics)."""
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats = pool.wait_stats()
+        status.update({
+            'checkouts': stats['checkouts'],
+            'timeouts': stats['timeouts'],
+            'wait_avg_ms': round(stats['wait_total'] / stats['checkouts'] * 1000, 2)
+            if stats['checkouts'] else 0.0,
+            'wait_max_ms': round(stats['wait_max'] * 1000, 2),
+        })
+    return status
+
+
+def request_query_stats():
+    """(aantal statements, totale tijd in seconden) van het huidige request."""
+    return g.get('db_query_count', 0), g.get('db_query_time', 0.0)
+
+
+def install_slow_query_log(engine, threshold):
+    """
+    Log elke query die langer dan `threshold` seconden duurt, met de
+    (ingekorte) SQL, en tel aantal en tijd per request (zie request_query_stats).
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        elapsed = time.perf_counter() - started
+        if has_request_context():
+            g.db_query_count = g.get('db_query_count', 0) + 1
+            g.db_query_time = g.get('db_query_time', 0.0) + elapsed
+        if elapsed > threshold:
+            logger.warning("Trage query (%.0f ms): %s", elapsed * 1000, ' '.join(statement.split())[:500])
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed(context):
+        # Een mislukte query komt niet in after_cursor_execute; ruim de starttijd op
+        if context.connection is not None:
+            started = context.connection.info.get('query_started')
+            if started:
+                started.pop()
@@ -0,0 +1,129 @@
+import json
+import logging
+import smtplib
+import time
+from datetime import timedelta
+
+from flask import current_app
+from flask_mail import Message as MailMessage
+
+from app import mail
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_KEY = 'mail:dead-letter'
+
+
+def queue_email(subject, recipients, body, html=None, sender=None):
+    """Zet één e-mail in de wachtrij; zie queue_emails."""
+    return queue_emails([{
+        'subject': subject, 'recipients': list(recipients), 'body': body,
+        'html': html, 'sender': sender,
+    }])
+
+
+def queue_emails(messages):
+    """
+    Verstuur e-mails op de achtergrond (rq), zodat een trage of onbereikbare
+    SMTP-server geen request ophoudt. `messages` is een lijst dicts met
+    subject, recipients, body en optioneel html en sender; ze gaan in
+    batches van MAIL_BATCH_SIZE over één SMTP-verbinding.
+    Geeft False als de wachtrij (Redis) niet bereikbaar is.
+    """
+    batch_size = current_app.config['MAIL_BATCH_SIZE']
+    try:
+        for start in range(0, len(messages), batch_size):
+            current_app.task_queue.enqueue(
+                'app.tasks.send_email_batch', messages[start:start + batch_size]
+            )
+    except Exception as e:
+        logger.error("Kon %d e-mails niet in de wachtrij zetten: %s", len(messages), e)
+        return False
+    return True
+
+
+def retry_delay(attempt):
+    """Exponentiële backoff: MAIL_RETRY_BACKOFF, 2x, 4x, ... seconden."""
+    return timedelta(seconds=current_app.config['MAIL_RETRY_BACKOFF'] * 2 ** attempt)
+
+
+def _build(message):
+    return MailMessage(
+        subject=message['subject'],
+        recipients=message['recipients'],
+        body=message['body'],
+        html=message.get('html'),
+        sender=message.get('sender'),
+    )
+
+
+def _is_permanent(error):
+    # 5xx: het adres bestaat niet of het bericht wordt geweigerd; opnieuw proberen helpt niet
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def deliver(messages):
+    """
+    Verstuur `messages` over één SMTP-verbinding. Geeft (niet verstuurd,
+    permanent mislukt, fout): de eerste lijst is later opnieuw te proberen
+    (verbinding weg, time-out, 4xx), de tweede is [(bericht, fout), ...]:
+    5xx-weigeringen en berichten die niet te bouwen zijn (bijv. een
+    ongeldige header).
+    """
+    permanent = []
+    remaining = list(messages)
+    error = None
+    try:
+        with mail.connect() as connection:
+            while remaining:
+                try:
+                    connection.send(_build(remaining[0]))
+                except smtplib.SMTPException as e:
+                    if not _is_permanent(e):
+                        raise
+                    permanent.append((remaining[0], e))
+                except OSError:
+                    raise
+                except Exception as e:
+                    # Fout in het bericht zelf: opnieuw proberen helpt niet, en de
+                    # rest van de batch (ook wat al weg is) mag er niet op stuklopen
+                    logger.warning("E-mail '%s' niet te versturen: %r", remaining[0].get('subject'), e)
+                    permanent.append((remaining[0], e))
+                remaining.pop(0)
+    except (smtplib.SMTPException, OSError) as e:
+        error = e
+        logger.warning("SMTP-fout, %d e-mails later opnieuw: %s", len(remaining), e)
+    return remaining, permanent, error
+
+
+def dead_letter(redis, message, error, attempts):
+    """Bewaar een definitief mislukte e-mail in de dead-letter-lijst (nieuwste eerst)."""
+    # Sommige fouten (bijv. flask-mail's BadHeaderError) hebben geen tekst
+    error = str(error) or repr(error)
+    logger.error("E-mail '%s' aan %s opgegeven na %d pogingen: %s",
+                 message['subject'], ', '.join(message['recipients']), attempts, error)
+    pipe = redis.pipeline()
+    pipe.lpush(DEAD_LETTER_KEY, json.dumps({
+        'message': message, 'error': error, 'attempts': attempts, 'failed_at': time.time(),
+    }))
+    pipe.ltrim(DEAD_LETTER_KEY, 0, current_app.config['MAIL_DEAD_LETTER_MAX'] - 1)
+    pipe.execute()
+
+
+def requeue_dead_letters(redis, limit=None):
+    """Haal e-mails uit de dead-letter-lijst en zet ze opnieuw in de wachtrij. Geeft het aantal."""
+    messages = []
+    while limit is None or len(messages) < limit:
+        raw = redis.rpop(DEAD_LETTER_KEY)
+        if raw is None:
+            break
+        messages.append(json.loads(raw)['message'])
+    if messages and not queue_emails(messages):
+        # Terugzetten, anders zijn ze kwijt
+        redis.rpush(DEAD_LETTER_KEY, *[json.dumps({'message': m, 'error': 'requeue failed',
+                                                    'attempts': 0, 'failed_at': time.time()})
+                                       for m in messages])
+        return 0
+    return len(messages)
@@ -0,0 +1,240 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone
+
+from app.calendar_service import GoogleCalendarService
+from app.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Overlap bij incrementele sync, zodat we niets missen door klokverschil
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def _utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _parse(value):
+    return _utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+def _event_bounds(event):
+    """Begin en eind van een Google-event als UTC datetimes (ook voor hele dagen)."""
+    bounds = []
+    for field in ('start', 'end'):
+        part = event.get(field, {})
+        if 'dateTime' in part:
+            bounds.append(_parse(part['dateTime']))
+        else:
+            day = date.fromisoformat(part['date'])
+            bounds.append(datetime(day.year, day.month, day.day, tzinfo=timezone.utc))
+    return bounds
+
+
+def _overlaps(event, time_min, time_max):
+    try:
+        start, end = _event_bounds(event)
+    except (KeyError, ValueError):
+        return False
+    return start < time_max and end > time_min
+
+
+class MemoryBackend:
+    """
+    Per-proces opslag (LRU). Alleen geschikt bij één worker: een eigen
+    wijziging (patch_event) komt niet in de kopie van andere workers.
+    """
+
+    def __init__(self, max_entries=1000):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            raw = self._entries.get(key)
+            if raw is not None:
+                self._entries.move_to_end(key)
+            return raw
+
+    def set(self, key, raw):
+        with self._lock:
+            self._entries[key] = raw
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """Gedeelde opslag in Redis, zodat alle workers dezelfde store zien."""
+
+    def __init__(self, connection, ttl):
+        self._redis = connection
+        self._ttl = ttl
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return raw.decode() if raw is not None else None
+
+    def set(self, key, raw):
+        self._redis.set(key, raw, ex=self._ttl)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+
+class EventStore:
+    """
+    Lokale kopie van de Google Calendar-evenementen per gebruiker en kalender.
+
+    Een entry bevat het tijdvenster dat we kennen, de evenementen daarin en
+    het moment van de laatste sync. Vragen binnen dat venster worden uit de
+    store beantwoord; is de entry ouder dan `freshness`, dan halen we met
+    `updatedMin` alleen de wijzigingen op. Google's syncToken gebruiken we
+    niet: die mag niet samen met timeMin/timeMax, en zonder venster zou de
+    eerste sync de hele (herhaalde) agenda ophalen.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.freshness = timedelta(seconds=30)
+        self.max_span = timedelta(days=120)
+
+    def init_app(self, app):
+        self.freshness = timedelta(seconds=app.config['EVENT_STORE_FRESHNESS'])
+        self.max_span = timedelta(days=app.config['EVENT_STORE_MAX_SPAN_DAYS'])
+        if app.config['EVENT_STORE_BACKEND'] == 'redis':
+            self.backend = RedisBackend(app.redis, app.config['EVENT_STORE_TTL'])
+        else:
+            self.backend = MemoryBackend(app.config['EVENT_STORE_MAX_ENTRIES'])
+
+    @staticmethod
+    def _key(owner_id, calendar_id):
+        return f'calendar-events:{owner_id}:{calendar_id}'
+
+    def _load(self, key):
+        raw = self.backend.get(key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        entry['min'] = _parse(entry['min'])
+        entry['max'] = _parse(entry['max'])
+        entry['synced_at'] = _parse(entry['synced_at'])
+        return entry
+
+    def _save(self, key, entry):
+        self.backend.set(key, json.dumps({
+            'min': entry['min'].isoformat(),
+            'max': entry['max'].isoformat(),
+            'synced_at': entry['synced_at'].isoformat(),
+            'events': entry['events'],
+        }))
+
+    def get_events(self, owner_id, calendar_id, credentials, time_min, time_max, max_results=100):
+        """Evenementen in [time_min, time_max), gesorteerd op starttijd."""
+        time_min, time_max = _utc(time_min), _utc(time_max)
+        key = self._key(owner_id, calendar_id)
+        entry = self._load(key)
+        now = datetime.now(timezone.utc)
+
+        if entry and entry['min'] <= time_min and time_max <= entry['max']:
+            if now - entry['synced_at'] > self.freshness:
+                cache_lookup('event_store', 'stale')
+                self._sync_changes(entry, credentials, calendar_id, now)
+                self._save(key, entry)
+            else:
+                cache_lookup('event_store', 'hit')
+        else:
+            cache_lookup('event_store', 'miss')
+            entry = self._fetch_window(entry, credentials, calendar_id, time_min, time_max, now)
+            self._save(key, entry)
+
+        events = [e for e in entry['events'].values() if _overlaps(e, time_min, time_max)]
+        events.sort(key=lambda e: _event_bounds(e)[0])
+        return events[:max_results]
+
+    @staticmethod
+    def _apply(entry, event):
+        """Zet een (nieuwe versie van een) evenement in de entry, of haal het weg als het buiten het venster valt."""
+        if event.get('status') == 'cancelled' or not _overlaps(event, entry['min'], entry['max']):
+            entry['events'].pop(event['id'], None)
+        else:
+            entry['events'][event['id']] = event
+
+    def _sync_changes(self, entry, credentials, calendar_id, now):
+        service = GoogleCalendarService.get_calendar_service(credentials)
+        updated_min = entry['synced_at'] - SYNC_OVERLAP
+        changes = GoogleCalendarService.list_event_window(
+            service, entry['min'], entry['max'], calendar_id=calendar_id, updated_min=updated_min
+        )
+        for event in changes:
+            self._apply(entry, event)
+
+        # Een evenement dat naar buiten het venster is verplaatst zit niet in de
+        # query hierboven; de wijzigingen zonder venster laten zien wat weg moet
+        seen = {event['id'] for event in changes}
+        moved = GoogleCalendarService.list_changed_events(service, updated_min, calendar_id=calendar_id)
+        for event in moved:
+            if event['id'] in seen:
+                continue
+            entry['events'].pop(event['id'], None)
+            # Gewijzigde reeks: instanties die niet meer in het venster terugkwamen
+            for event_id, cached in list(entry['events'].items()):
+                if cached.get('recurringEventId') == event['id'] and event_id not in seen:
+                    del entry['events'][event_id]
+        entry['synced_at'] = now
+        logger.debug("Incrementele sync: %d wijzigingen in het venster, %d in totaal", len(changes), len(moved))
+
+    def _fetch_window(self, entry, credentials, calendar_id, time_min, time_max, now):
+        service = GoogleCalendarService.get_calendar_service(credentials)
+        fetched = GoogleCalendarService.list_event_window(
+            service, time_min, time_max, calendar_id=calendar_id
+        )
+        fetched = {event['id']: event for event in fetched}
+
+        # Sluit het nieuwe venster aan op het bekende venster als dat kan (bijv. volgende maand)
+        if entry and entry['min'] <= time_max and time_min <= entry['max']:
+            new_min, new_max = min(entry['min'], time_min), max(entry['max'], time_max)
+            if new_max - new_min <= self.max_span:
+                events = {
+                    event_id: event for event_id, event in entry['events'].items()
+                    if not _overlaps(event, time_min, time_max)
+                }
+                events.update(fetched)
+                # De oudste sync-tijd blijft staan, zodat de volgende delta alles dekt
+                return {'min': new_min, 'max': new_max,
+                        'synced_at': entry['synced_at'], 'events': events}
+
+        return {'min': time_min, 'max': time_max, 'synced_at': now, 'events': fetched}
+
+    def patch_event(self, owner_id, calendar_id, event=None, deleted_id=None):
+        """
+        Verwerk een eigen wijziging direct in de store en forceer een delta bij
+        de volgende lezing, zodat de gebruiker nooit een verouderde versie ziet.
+        """
+        key = self._key(owner_id, calendar_id)
+        entry = self._load(key)
+        if entry is None:
+            return
+        if deleted_id is not None:
+            entry['events'].pop(deleted_id, None)
+        if event is not None:
+            # Verplaatst naar buiten het venster: dan hoort het er niet meer in
+            self._apply(entry, event)
+        entry['synced_at'] = min(entry['synced_at'], datetime.now(timezone.utc) - self.freshness)
+        self._save(key, entry)
+
+    def invalidate(self, owner_id, calendar_id):
+        self.backend.delete(self._key(owner_id, calendar_id))
+
+
+event_store = EventStore()
@@ -1,3 +1,4 @@
+from flask import request
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, TextAreaField, SelectField
 from wtforms.validators import ValidationError, DataRequired, Length
@@ -41,6 +42,17 @@ class PostForm(FlaskForm):
     family = SelectField('Post to Family', coerce=int)
     submit = SubmitField('Submit')
 
+# Zoekformulier in de navigatiebalk (GET, dus zonder CSRF-token)
+class SearchForm(FlaskForm):
+    q = StringField('Search', validators=[DataRequired(), Length(max=200)])
+
+    def __init__(self, *args, **kwargs):
+        if 'formdata' not in kwargs:
+            kwargs['formdata'] = request.args
+        if 'meta' not in kwargs:
+            kwargs['meta'] = {'csrf': False}
+        super().__init__(*args, **kwargs)
+
 # Formulier om een privébericht te sturen
 class MessageForm(FlaskForm):
     message = TextAreaField('Message', validators=[
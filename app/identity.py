@@ -0,0 +1,61 @@
+import logging
+
+import sqlalchemy as sa
+from flask import session, g
+
+from app import db
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+# Sentinel zodat ook "geen gebruiker" (None) per request onthouden wordt
+_MISSING = object()
+
+
+def _session_sub():
+    user_info = session.get('user', {}).get('userinfo', {})
+    if not user_info:
+        return None
+    sub = user_info.get('sub')
+    if not sub:
+        logger.error("No sub found in user info, cannot identify user")
+    return sub
+
+
+def _load_user(sub):
+    g.current_user_queries = g.get('current_user_queries', 0) + 1
+    return db.session.scalar(sa.select(User).where(User.sub == sub))
+
+
+def get_current_user():
+    """
+    Haal de momenteel ingelogde gebruiker op via Auth0-sub uit de sessie.
+    Het resultaat wordt per request in flask.g bewaard, zodat templates en
+    routes deze functie vaak mogen aanroepen zonder extra queries.
+    Retourneert None als er geen geldige sessie is.
+    """
+    sub = _session_sub()
+    if not sub:
+        return None
+
+    cached = g.get('_current_user', _MISSING)
+    if cached is not _MISSING and g.get('_current_user_sub') == sub:
+        return cached
+
+    user = _load_user(sub)
+    if user is None:
+        logger.debug("User not found in database, should have been created in callback")
+    g._current_user = user
+    g._current_user_sub = sub
+    return user
+
+
+def forget_current_user():
+    """Vergeet de gebruiker van dit request (bijv. na login of logout)."""
+    g.pop('_current_user_sub', None)
+    g.pop('_current_user', None)
+
+
+def current_user_query_count():
+    """Aantal keren dat in dit request de gebruiker is opgezocht."""
+    return g.get('current_user_queries', 0)
@@ -0,0 +1,123 @@
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import tempfile
+
+# Sleutel = sha256 van de inhoud + extensie, bijv. '9f86d0…0a08.jpg';
+# afgeleide varianten (thumbnails) hebben een achtervoegsel: '9f86d0…0a08-32.webp'
+KEY_PATTERN = re.compile(r'^[0-9a-f]{64}(-[0-9]{1,4})?\.[a-z0-9]{2,5}$')
+
+EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _extension(mimetype):
+    return EXTENSIONS.get(mimetype) or (mimetypes.guess_extension(mimetype or '') or '.bin').lstrip('.')
+
+
+def is_valid_key(key):
+    return bool(key) and KEY_PATTERN.match(key) is not None
+
+
+def mimetype_for(key):
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+class LocalImageStore:
+    """
+    Content-addressed opslag op het lokale bestandssysteem. Een bestand
+    verandert nooit meer na het schrijven (een nieuwe foto krijgt een nieuwe
+    sleutel), dus clients en proxies mogen het onbeperkt cachen.
+
+    Bestanden staan onder `root/ab/cd/<sleutel>` zodat geen enkele map
+    onhandelbaar groot wordt.
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def init_app(self, app):
+        self.root = app.config['IMAGE_STORE_PATH']
+        os.makedirs(self.root, exist_ok=True)
+
+    def relative_path(self, key):
+        if not is_valid_key(key):
+            raise ValueError(f'Ongeldige afbeeldingssleutel: {key!r}')
+        return os.path.join(key[:2], key[2:4], key)
+
+    def path(self, key):
+        return os.path.join(self.root, self.relative_path(key))
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def save(self, data, mimetype):
+        """Schrijf `data` weg (als die er nog niet staat) en geef de sleutel terug."""
+        return self.save_stream(io.BytesIO(data), mimetype)
+
+    def save_stream(self, stream, mimetype):
+        """
+        Kopieer `stream` in blokken naar de store en hash tegelijk de inhoud,
+        zodat een groot bestand nooit in zijn geheel in het geheugen staat.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+            key = f'{digest.hexdigest()}.{_extension(mimetype)}'
+            target = self.path(key)
+            if os.path.isfile(target):
+                os.remove(tmp)
+                return key
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return key
+
+    def save_as(self, key, data):
+        """
+        Schrijf `data` onder een opgegeven sleutel. Alleen voor inhoud die
+        volledig uit een content-addressed bestand is afgeleid (thumbnails),
+        anders klopt de 'immutable'-belofte niet meer.
+        """
+        target = self.path(key)
+        if os.path.isfile(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Eerst naar een tijdelijk bestand, dan atomair hernoemen: nooit een half bestand zichtbaar
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+image_store = LocalImageStore()
@@ -0,0 +1,207 @@
+import logging
+import re
+import secrets
+from datetime import datetime, timezone, timedelta
+
+import sqlalchemy as sa
+
+from app import db
+from app.models import FamilyInvite, Membership, insert_ignoring_duplicates
+
+logger = logging.getLogger(__name__)
+
+INVITE_TTL = timedelta(days=7)
+
+# Grove controle: één @, geen spaties, een punt in het domein. Of het adres
+# echt bestaat merkt de mail-worker (5xx gaat naar de dead-letter-lijst).
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+EMAIL_MAX_LENGTH = 120
+
+# Uitkomsten van redeem_invite / invite_problem
+JOINED = 'joined'
+ALREADY_MEMBER = 'already_member'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+USED = 'used'
+
+
+def normalize_emails(emails):
+    """
+    Kleine letters, zonder spaties en dubbelen (volgorde blijft). Geeft
+    (geldige adressen, ongeldige invoer).
+    """
+    valid, invalid, seen = [], [], set()
+    for raw in emails:
+        email = raw.strip().lower() if isinstance(raw, str) else ''
+        if not EMAIL_PATTERN.match(email) or len(email) > EMAIL_MAX_LENGTH:
+            invalid.append(raw)
+        elif email not in seen:
+            seen.add(email)
+            valid.append(email)
+    return valid, invalid
+
+
+def active(now=None):
+    """
+    Voorwaarde voor invites die nog te gebruiken zijn: niet geaccepteerd en
+    niet verlopen. `accepted = false` letterlijk zoals in ix_family_invite_active,
+    anders gebruikt de planner de partiële index niet.
+    """
+    now = now or datetime.now(timezone.utc)
+    return sa.and_(
+        FamilyInvite.accepted == sa.false(),
+        sa.or_(FamilyInvite.expires_at.is_(None), FamilyInvite.expires_at > now),
+    )
+
+
+def invite_problem(invite, now=None):
+    """Waarom `invite` niet (meer) te gebruiken is: INVALID, EXPIRED, USED, of None."""
+    if invite is None:
+        return INVALID
+    now = now or datetime.now(timezone.utc)
+    expires_at = invite.expires_at
+    if expires_at is not None and expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at is not None and expires_at <= now:
+        return EXPIRED
+    if invite.accepted:
+        return USED
+    return None
+
+
+def redeem_invite(token, user_id):
+    """
+    Wissel `token` in voor een lidmaatschap, in één transactie die hier ook
+    gecommit (of teruggedraaid) wordt. Geeft (uitkomst, family_id).
+
+    De invite wordt geclaimd met UPDATE ... SET accepted = true WHERE
+    accepted = false AND niet verlopen RETURNING family_id: van twee
+    gelijktijdige pogingen krijgt de database er maar één een rij terug,
+    de ander wacht op de rijlock en ziet daarna accepted = true. Het
+    lidmaatschap gaat erin met ON CONFLICT DO NOTHING op
+    uq_membership_user_family; is de gebruiker al lid, dan draaien we de
+    claim terug zodat de invite bruikbaar blijft voor iemand anders.
+    """
+    now = datetime.now(timezone.utc)
+    claim = (
+        sa.update(FamilyInvite)
+        .where(FamilyInvite.token == token, active(now))
+        .values(accepted=True)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        family_id = db.session.scalar(claim.returning(FamilyInvite.family_id))
+    else:
+        # Zonder RETURNING (MySQL): de UPDATE houdt de rijlock tot de commit
+        claimed = db.session.execute(claim).rowcount
+        family_id = db.session.scalar(
+            sa.select(FamilyInvite.family_id).where(FamilyInvite.token == token)
+        ) if claimed else None
+    if family_id is None:
+        db.session.rollback()
+        # Alleen bij een mislukte claim: waarom? (voor de melding aan de gebruiker)
+        invite = db.session.scalar(sa.select(FamilyInvite).where(FamilyInvite.token == token))
+        return invite_problem(invite, now) or USED, None
+
+    inserted = db.session.execute(
+        insert_ignoring_duplicates(Membership).values(user_id=user_id, family_id=family_id)
+    ).rowcount
+    if not inserted:
+        db.session.rollback()
+        return ALREADY_MEMBER, family_id
+    db.session.commit()
+    logger.info("Gebruiker %s via invite lid geworden van familie %s", user_id, family_id)
+    return JOINED, family_id
+
+
+def latest_active_invite(family_id):
+    """De nieuwste openstaande invite van een familie, of None (via ix_family_invite_active)."""
+    return db.session.scalar(
+        sa.select(FamilyInvite)
+        .where(FamilyInvite.family_id == family_id, active())
+        .order_by(FamilyInvite.created_at.desc())
+        .limit(1)
+    )
+
+
+def create_invites(family_id, emails):
+    """
+    Zorg voor een openstaande invite per adres in `emails` (genormaliseerd,
+    zie normalize_emails). Bestaande, nog geldige invites voor hetzelfde
+    adres worden hergebruikt (één SELECT); de rest gaat in één INSERT met
+    meerdere rijen. Geeft per adres, in de volgorde van `emails`, een dict
+    met email, token, expires_at en created. Committen doet de aanroeper.
+    """
+    if not emails:
+        return []
+    now = datetime.now(timezone.utc)
+    existing = {}
+    for email, token, expires_at in db.session.execute(
+        sa.select(FamilyInvite.invited_email, FamilyInvite.token, FamilyInvite.expires_at)
+        .where(
+            FamilyInvite.family_id == family_id,
+            sa.func.lower(FamilyInvite.invited_email).in_(emails),
+            active(now),
+        )
+        # Meerdere open invites voor één adres: de nieuwste wint
+        .order_by(FamilyInvite.created_at)
+    ):
+        if expires_at is not None and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        existing[email.lower()] = {'token': token, 'expires_at': expires_at, 'created': False}
+
+    rows = [
+        {
+            'family_id': family_id,
+            'token': secrets.token_urlsafe(16),
+            'invited_email': email,
+            'created_at': now,
+            'expires_at': now + INVITE_TTL,
+            'accepted': False,
+        }
+        for email in emails if email not in existing
+    ]
+    if rows:
+        # values(rows) rendert één INSERT ... VALUES (...), (...); een executemany
+        # zou per driver alsnog één statement per rij kunnen worden
+        db.session.execute(sa.insert(FamilyInvite).values(rows))
+    logger.info("Familie %s: %d invites aangemaakt, %d hergebruikt", family_id, len(rows), len(existing))
+
+    created = {row['invited_email']: {'token': row['token'], 'expires_at': row['expires_at'], 'created': True}
+               for row in rows}
+    return [{'email': email, **(existing.get(email) or created[email])} for email in emails]
+
+
+def sweep_invites(retention, batch_size):
+    """
+    Verwijder invites die niet meer te gebruiken zijn: verlopen, of
+    geaccepteerd, en dat al langer dan `retention` (timedelta). Zo lang
+    ziet iemand met een oude link nog 'verlopen' of 'al gebruikt' in plaats
+    van 'ongeldig'. Per batch van `batch_size` een eigen transactie, zodat
+    een grote achterstand de tabel niet lang vasthoudt. Geeft het aantal.
+    """
+    cutoff = datetime.now(timezone.utc) - retention
+    # Geen accepted_at: voor geaccepteerde invites telt de aanmaakdatum
+    done = sa.or_(
+        FamilyInvite.expires_at < cutoff,
+        sa.and_(FamilyInvite.accepted == sa.true(), FamilyInvite.created_at < cutoff),
+    )
+    removed = 0
+    while True:
+        ids = db.session.scalars(
+            sa.select(FamilyInvite.id).where(done).order_by(FamilyInvite.id).limit(batch_size)
+        ).all()
+        if not ids:
+            break
+        db.session.execute(
+            sa.delete(FamilyInvite)
+            .where(FamilyInvite.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        removed += len(ids)
+        if len(ids) < batch_size:
+            break
+    if removed:
+        logger.info("%d verlopen of geaccepteerde invites verwijderd", removed)
+    return removed
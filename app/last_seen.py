@@ -0,0 +1,126 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models import User
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(value):
+    # SQLite en Postgres (zonder timezone) geven naive datetimes terug in UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class LastSeenTracker:
+    """
+    Verzamelt 'last seen'-activiteit in het geheugen en schrijft die in
+    batches weg met één UPDATE voor meerdere gebruikers, in plaats van een
+    commit per request. Elke worker heeft zijn eigen buffer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._app = None
+        self._flusher = None
+        self._stop = threading.Event()
+        self.throttle = timedelta(seconds=60)
+        self.flush_interval = 10
+        self.flush_batch = 100
+
+    def init_app(self, app):
+        self._app = app
+        self.throttle = timedelta(seconds=app.config.get('LAST_SEEN_THROTTLE', 60))
+        self.flush_interval = app.config.get('LAST_SEEN_FLUSH_INTERVAL', 10)
+        self.flush_batch = app.config.get('LAST_SEEN_FLUSH_BATCH', 100)
+        atexit.register(self._flush_on_exit)
+
+    def touch(self, user):
+        """Registreer activiteit; schrijft pas als last_seen ouder is dan de throttle."""
+        now = datetime.now(timezone.utc)
+        last_seen = _as_utc(user.last_seen)
+        if last_seen is not None and now - last_seen < self.throttle:
+            return
+
+        with self._lock:
+            self._pending[user.id] = now
+            flush_now = len(self._pending) >= self.flush_batch
+        # Zonder het object 'dirty' te maken: geen UPDATE bij de volgende commit
+        set_committed_value(user, 'last_seen', now)
+
+        self._ensure_flusher()
+        if flush_now:
+            self.flush()
+
+    def pending_for(self, user_id):
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def apply_pending(self, user):
+        """Toon een nog niet weggeschreven last_seen (bijv. op de profielpagina)."""
+        pending = self.pending_for(user.id)
+        if pending is not None:
+            set_committed_value(user, 'last_seen', pending)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+
+        table = User.__table__
+        whens = {
+            user_id: sa.literal(seen, table.c.last_seen.type)
+            for user_id, seen in batch.items()
+        }
+        stmt = (
+            sa.update(table)
+            .where(table.c.id.in_(list(batch)))
+            .values(last_seen=sa.case(whens, value=table.c.id))
+        )
+        try:
+            # Eigen verbinding, los van de transactie van het lopende request
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception as e:
+            logger.error("Kon last_seen niet wegschrijven voor %d gebruikers: %s", len(batch), e)
+            with self._lock:
+                for user_id, seen in batch.items():
+                    self._pending.setdefault(user_id, seen)
+            return 0
+        return len(batch)
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            # Lazy gestart, zodat elke (geforkte) worker zijn eigen thread heeft
+            self._flusher = threading.Thread(
+                target=self._run, name='last-seen-flusher', daemon=True
+            )
+            self._flusher.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._app.app_context():
+                self.flush()
+
+    def _flush_on_exit(self):
+        self._stop.set()
+        if self._app is not None:
+            with self._app.app_context():
+                self.flush()
+
+
+tracker = LastSeenTracker()
@@ -0,0 +1,158 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+# Binnenkomende request-ids (van een proxy of load balancer) alleen overnemen als ze er netjes uitzien
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Attributen die elk LogRecord heeft; de rest komt uit extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+def current_request_id():
+    if has_request_context():
+        return g.get('request_id', '-')
+    return '-'
+
+
+class RequestIdFilter(logging.Filter):
+    """Zet record.request_id, zodat alle regels van één request te correleren zijn."""
+
+    def filter(self, record):
+        record.request_id = current_request_id()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Laat een fractie `rate` van de DEBUG-regels door; INFO en hoger altijd.
+    Binnen een request wordt één keer per request beslist, zodat een
+    gesampled request al zijn debugregels houdt en de rest geen enkele.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if has_request_context():
+            sampled = g.get('log_sampled')
+            if sampled is None:
+                sampled = g.log_sampled = random.random() < self.rate
+            return sampled
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Eén JSON-object per regel: tijd, niveau, logger, bericht, request_id en eventuele extra velden."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+
+def make_formatter(app):
+    if app.config['LOG_FORMAT'] == 'json':
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def configure_handler(handler, app):
+    """Geef een handler het formaat, de request-id en de sampling van de app."""
+    handler.setFormatter(make_formatter(app))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(DebugSampler(app.config['LOG_DEBUG_SAMPLE_RATE']))
+    return handler
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler die een record stil laat vallen als de wachtrij vol is (zonder traceback op stderr)."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def start_queue_listener(handler, maxsize=1000):
+    """
+    Laat `handler` (bijv. de SMTPHandler) in een eigen thread draaien en geef
+    een QueueHandler terug om aan een logger te hangen. Loggen is dan alleen
+    een put in de wachtrij; is die vol, dan vervalt het record.
+    """
+    records = queue.Queue(maxsize)
+    queue_handler = DroppingQueueHandler(records)
+    queue_handler.setLevel(handler.level)
+    # request_id invullen zolang het record nog in de request-context is
+    queue_handler.addFilter(RequestIdFilter())
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler
+
+
+def _assign_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+
+
+def _echo_request_id(response):
+    if 'request_id' in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    return response
+
+
+def init_app(app):
+    """
+    Configureer logging voor de hele applicatie: niveau uit LOG_LEVEL, één
+    handler op stderr (tekst of JSON) en een request-id per request.
+
+    Bij een uitgeschakeld niveau kost een regel als logger.debug("... %s", x)
+    alleen de niveaucheck: de argumenten worden pas in de formatter ingevuld.
+    """
+    level = app.config['LOG_LEVEL'].upper()
+    root = logging.getLogger()
+    # create_app kan vaker draaien (worker, CLI); vervang onze handler in plaats van te stapelen
+    for handler in [h for h in root.handlers if getattr(h, '_famplan', False)]:
+        root.removeHandler(handler)
+    handler = configure_handler(logging.StreamHandler(sys.stderr), app)
+    handler._famplan = True
+    root.addHandler(handler)
+    root.setLevel(level)
+    app.logger.setLevel(level)
+
+    # Bibliotheken die op DEBUG per request of per query loggen houden we op WARNING
+    for name in app.config['LOG_QUIET_LOGGERS']:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+
+    app.before_request(_assign_request_id)
+    app.after_request(_echo_request_id)
@@ -0,0 +1,126 @@
+import os
+import time
+
+from flask import Response, abort, g, request
+from googleapiclient.http import HttpRequest
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+
+from app.db_metrics import pool_status, request_query_stats
+
+# Onder gunicorn zet gunicorn.conf.py PROMETHEUS_MULTIPROC_DIR; elke worker
+# schrijft dan naar eigen bestanden en /metrics telt alle workers op.
+
+REQUEST_COUNT = Counter(
+    'famplan_http_requests_total', 'HTTP-requests per endpoint',
+    ['endpoint', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'famplan_http_request_duration_seconds', 'Verwerkingstijd per endpoint',
+    ['endpoint', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_QUERIES = Histogram(
+    'famplan_db_queries_per_request', 'Aantal SQL-statements per request',
+    ['endpoint'], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+DB_TIME = Histogram(
+    'famplan_db_time_per_request_seconds', 'Tijd in SQL-statements per request',
+    ['endpoint'], buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+DB_POOL = Gauge(
+    'famplan_db_pool_connections', 'Verbindingen in de DB-pool per toestand',
+    ['state'], multiprocess_mode='livesum'
+)
+GOOGLE_CALLS = Counter(
+    'famplan_google_api_calls_total', 'Calls naar Google-API\'s',
+    ['method', 'outcome']
+)
+GOOGLE_LATENCY = Histogram(
+    'famplan_google_api_call_duration_seconds', 'Duur van Google-API-calls',
+    ['method'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+)
+CACHE_LOOKUPS = Counter(
+    'famplan_cache_lookups_total', 'Cache-lookups; hit ratio = hit / alle results',
+    ['cache', 'result']
+)
+
+# Lange verbindingen zouden de latency-histogrammen alleen vertekenen
+_UNTIMED_ENDPOINTS = {'stream', 'metrics'}
+
+
+def cache_lookup(cache, result):
+    """Tel een cache-lookup (result: 'hit', 'miss' of bijv. 'stale')."""
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def observe_google_call(method, started, outcome):
+    GOOGLE_CALLS.labels(method, outcome).inc()
+    GOOGLE_LATENCY.labels(method).observe(time.perf_counter() - started)
+
+
+class MeteredHttpRequest(HttpRequest):
+    """HttpRequest van googleapiclient die elke execute() meet, gelabeld met de API-methode."""
+
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = super().execute(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            observe_google_call(self.methodId or 'unknown', started, outcome)
+
+
+def _endpoint():
+    # Alleen bekende routes als label, anders groeit het aantal series met elke 404-URL
+    return request.url_rule.endpoint if request.url_rule is not None else 'unmatched'
+
+
+def _start_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.pop('_metrics_started', None)
+    endpoint = _endpoint()
+    REQUEST_COUNT.labels(endpoint, request.method, response.status_code).inc()
+    if started is not None and endpoint not in _UNTIMED_ENDPOINTS:
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        queries, query_time = request_query_stats()
+        DB_QUERIES.labels(endpoint).observe(queries)
+        DB_TIME.labels(endpoint).observe(query_time)
+    return response
+
+
+def _update_pool_gauges(engine):
+    status = pool_status(engine)
+    for state in ('checked_out', 'checked_in', 'overflow'):
+        if state in status:
+            DB_POOL.labels(state).set(status[state])
+
+
+def init_app(app, db):
+    app.before_request(_start_timer)
+
+    @app.after_request
+    def after_request(response):
+        _record_request(response)
+        _update_pool_gauges(db.engine)
+        return response
+
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -7,8 +7,11 @@ import sqlalchemy.orm as so
 # ──────────────────────────────────────────────────────────────────────────────
 # NEW: import the association_proxy helper
 from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.dialects import postgresql, sqlite
 # ──────────────────────────────────────────────────────────────────────────────
 from app import db
+from app.pagination import keyset_paginate
+from app.avatars import nearest_size, variant_key
 import json
 import time
 import redis
@@ -37,6 +40,27 @@ class PaginatedAPIMixin(object):
         }
         return data
 
+    # Zelfde respons, maar met keyset-paginatie: opaque cursors en geen COUNT(*)
+    @staticmethod
+    def to_cursor_collection_dict(query, order_by, cursor, per_page, endpoint,
+                                  descending=False, **kwargs):
+        resources = keyset_paginate(query, order_by, cursor=cursor,
+                                    per_page=per_page, descending=descending)
+        data = {
+            'items': [item.to_dict() for item in resources.items],
+            '_meta': {
+                'per_page': per_page,
+                'next_cursor': resources.next_cursor,
+                'prev_cursor': resources.prev_cursor
+            },
+            '_links': {
+                'self':  url_for(endpoint, cursor=cursor, per_page=per_page, **kwargs),
+                'next':  url_for(endpoint, cursor=resources.next_cursor, per_page=per_page, **kwargs) if resources.has_next else None,
+                'prev':  url_for(endpoint, cursor=resources.prev_cursor, per_page=per_page, **kwargs) if resources.has_prev else None
+            }
+        }
+        return data
+
 # Definieer de 'followers' tabel voor een many-to-many relatie tussen gebruikers
 followers = sa.Table(
     'followers',
@@ -45,6 +69,16 @@ followers = sa.Table(
     sa.Column('followed_id', sa.Integer, sa.ForeignKey('user.id'), primary_key=True)
 )
 
+
+def insert_ignoring_duplicates(table):
+    """INSERT dat een rij met een al bestaande sleutel overslaat (ON CONFLICT DO NOTHING)."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return sa.insert(table).prefix_with('IGNORE')
+
 # -------------------------------------------------------------------
 # Nieuwe modellen voor familie-functionaliteit
 # -------------------------------------------------------------------
@@ -127,10 +161,24 @@ class FamilyInvite(db.Model):
     - Elke invite heeft een unieke token.
     - Optioneel gebonden aan een e-mailadres.
     - Kan verlopen of worden geaccepteerd.
+    - Verlopen en geaccepteerde invites ruimt app.invites.sweep_invites op.
     """
+    __table_args__ = (
+        # Invites per familie, nieuwste eerst; vervangt de index op alleen family_id
+        sa.Index('ix_family_invite_family_id_created_at', 'family_id', 'created_at'),
+        # Partiële index op openstaande invites (PostgreSQL, SQLite); met token en
+        # expires_at erin beantwoordt PostgreSQL 'laatste open invite' uit de index
+        sa.Index(
+            'ix_family_invite_active', 'family_id', 'created_at',
+            postgresql_where=sa.text('accepted = false'),
+            postgresql_include=['token', 'expires_at'],
+            sqlite_where=sa.text('accepted = 0'),
+        ),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     family_id: so.Mapped[int] = so.mapped_column(
-        sa.ForeignKey('family.id'), nullable=False, index=True
+        sa.ForeignKey('family.id'), nullable=False
     )
     token: so.Mapped[str] = so.mapped_column(
         sa.String(32), unique=True, nullable=False,
@@ -169,10 +217,15 @@ class User(PaginatedAPIMixin, db.Model):
     email: so.Mapped[str] = so.mapped_column(sa.String(120), index=True, unique=True)
     sub = db.Column(db.String(120), index=True, unique=True, nullable=False)  # Auth0 sub
     last_message_read_time: so.Mapped[Optional[datetime]]
+    # Bijgehouden teller van berichten na last_message_read_time (zie count_unread_messages)
+    unread_messages: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    # Bijgehouden door follow/unfollow; app.counters herstelt eventuele drift
+    num_followers: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
+    num_following: so.Mapped[int] = so.mapped_column(default=0, server_default='0')
     token: so.Mapped[Optional[str]] = so.mapped_column(sa.String(32), index=True, unique=True)
     token_expiration: so.Mapped[Optional[datetime]]
+    # Sleutel van de profielfoto in de image store (sha256 van de inhoud + extensie)
     profile_image: so.Mapped[Optional[str]] = so.mapped_column(sa.String(128), nullable=True)
-    profile_image_data = db.Column(db.LargeBinary, nullable=True)  # Voor de binaire data van de foto
     profile_image_mime = db.Column(db.String(64), nullable=True)  # Voor de MIME-type (bijv. image/jpeg)
 
     # Relaties met andere entiteiten
@@ -234,33 +287,55 @@ class User(PaginatedAPIMixin, db.Model):
         return f'<User {self.username}>'
 
     # Bestaande methodes (avatar, follow, unread_message_count, etc.) hieronder…
-    def avatar(self, size):
-        if self.profile_image_data:  # Als er een foto in de database staat
-            return url_for('get_profile_image', user_id=self.id, _external=True)
+    def avatar(self, size, fmt='webp'):
+        # Het kleinste voorgerenderde formaat dat groot genoeg is, als WebP of JPEG ('jpg')
+        if self.profile_image:  # Als er een foto in de image store staat
+            key = variant_key(self.profile_image, nearest_size(size), fmt)
+            return url_for('profile_image_file', key=key, _external=True)
         # Fallback naar Gravatar
         digest = md5(self.email.lower().encode('utf-8')).hexdigest()
         return f'https://www.gravatar.com/avatar/{digest}?d=identicon&s={size}'
 
 
     def follow(self, user):
-        if not self.is_following(user):
-            self.following.add(user)
+        # Eén statement in plaats van eerst is_following; alleen een echte nieuwe rij telt mee
+        result = db.session.execute(
+            insert_ignoring_duplicates(followers).values(follower_id=self.id, followed_id=user.id)
+        )
+        if result.rowcount:
+            self.num_following = User.num_following + 1
+            user.num_followers = User.num_followers + 1
 
     def unfollow(self, user):
-        if self.is_following(user):
-            self.following.remove(user)
+        result = db.session.execute(
+            followers.delete().where(
+                followers.c.follower_id == self.id, followers.c.followed_id == user.id
+            )
+        )
+        if result.rowcount:
+            self.num_following = User.num_following - 1
+            user.num_followers = User.num_followers - 1
 
     def is_following(self, user):
         query = self.following.select().where(User.id == user.id)
         return db.session.scalar(query) is not None
 
+    def following_among(self, user_ids):
+        """Welke van `user_ids` volgt deze gebruiker? Eén query, voor lijsten met follow-knoppen."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        return set(db.session.scalars(
+            sa.select(followers.c.followed_id).where(
+                followers.c.follower_id == self.id, followers.c.followed_id.in_(user_ids)
+            )
+        ))
+
     def followers_count(self):
-        query = sa.select(sa.func.count()).select_from(self.followers.select().subquery())
-        return db.session.scalar(query)
+        return self.num_followers
 
     def following_count(self):
-        query = sa.select(sa.func.count()).select_from(self.following.select().subquery())
-        return db.session.scalar(query)
+        return self.num_following
 
     def following_posts(self):
         Author = so.aliased(User)
@@ -274,7 +349,41 @@ class User(PaginatedAPIMixin, db.Model):
             .order_by(Post.timestamp.desc())
         )
 
+    def family_conversations(self):
+        """
+        Alle families van deze gebruiker met hun laatste Post (en de auteur
+        daarvan) in één query. Retourneert (Family, Post of None)-tuples.
+        """
+        my_families = sa.select(Membership.family_id).where(Membership.user_id == self.id)
+        ranked = (
+            sa.select(
+                Post.id,
+                Post.family_id,
+                sa.func.row_number().over(
+                    partition_by=Post.family_id,
+                    order_by=(Post.timestamp.desc(), Post.id.desc())
+                ).label('rn')
+            )
+            .where(Post.family_id.in_(my_families))
+            .subquery()
+        )
+        LastPost = so.aliased(Post)
+        query = (
+            sa.select(Family, LastPost)
+            .join(Membership, Membership.family_id == Family.id)
+            .outerjoin(ranked, sa.and_(ranked.c.family_id == Family.id, ranked.c.rn == 1))
+            .outerjoin(LastPost, LastPost.id == ranked.c.id)
+            .where(Membership.user_id == self.id)
+            .options(so.joinedload(LastPost.author))
+            .order_by(Membership.id)
+        )
+        return db.session.execute(query).all()
+
     def unread_message_count(self):
+        return self.unread_messages
+
+    def count_unread_messages(self):
+        """De echte telling uit Message; de reconciliatie-job vergelijkt hiermee."""
         last_read_time = self.last_message_read_time or datetime(1900, 1, 1)
         query = sa.select(Message).where(
             Message.recipient == self,
@@ -284,6 +393,14 @@ class User(PaginatedAPIMixin, db.Model):
             sa.select(sa.func.count()).select_from(query.subquery())
         )
 
+    def receive_message(self):
+        # Ophogen in SQL (unread_messages = unread_messages + 1), in dezelfde transactie als het bericht
+        self.unread_messages = User.unread_messages + 1
+
+    def mark_messages_read(self):
+        self.last_message_read_time = datetime.now(timezone.utc)
+        self.unread_messages = 0
+
     def add_notification(self, name, data):
         db.session.execute(
             self.notifications.delete().where(Notification.name == name)
@@ -315,6 +432,11 @@ class User(PaginatedAPIMixin, db.Model):
 
 # Bestaande: Post-model
 class Post(db.Model):
+    __table_args__ = (
+        # Laatste post per familie (gesprekkenoverzicht) en chatgeschiedenis
+        sa.Index('ix_post_family_id_timestamp', 'family_id', 'timestamp'),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     body: so.Mapped[str] = so.mapped_column(sa.String(500))
     timestamp: so.Mapped[datetime] = so.mapped_column(
@@ -324,14 +446,30 @@ class Post(db.Model):
     author: so.Mapped[User] = so.relationship(back_populates='posts')
 
     # maakt mogelijk om familie-gebonden posts te maken
+    # geïndexeerd via ix_post_family_id_timestamp (family_id is de eerste kolom)
     family_id: so.Mapped[Optional[int]] = so.mapped_column(
-        sa.ForeignKey('family.id'), nullable=True, index=True
+        sa.ForeignKey('family.id'), nullable=True
     )
     family: so.Mapped[Optional['Family']] = so.relationship('Family', backref='posts')
 
     def __repr__(self):
         return f'<Post {self.body}>'
 
+    @staticmethod
+    def chat_feed(family_id):
+        """
+        Query voor de chatpagina van een familie, nieuwste bericht eerst.
+        De auteur wordt in dezelfde query meegeladen (geen N+1 in chat.html);
+        van de profielfoto staat in de User-rij alleen de sleutel in de
+        image store, dus de SELECT haalt geen afbeeldingsbytes op.
+        """
+        return (
+            sa.select(Post)
+            .where(Post.family_id == family_id)
+            .options(so.joinedload(Post.author))
+            .order_by(Post.timestamp.desc(), Post.id.desc())
+        )
+
 # Bestaande: Message-model
 class Message(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
@@ -0,0 +1,226 @@
+import json
+import logging
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy import event
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Markeert een volledig geladen feed; de score is de ondergrens van wat de
+# feed bevat ('-inf' = alles, anders de tijd van het nieuwste weggeknipte item)
+FLOOR = '\x00floor'
+
+# Voegt notificaties toe (per naam alleen de nieuwste, net als add_notification),
+# knipt de feed af op `maxlen` en ververst de TTL. ZADD GT zorgt dat een oude
+# snapshot uit de database nooit een nieuwere notificatie overschrijft.
+#   KEYS: feed (zset naam -> timestamp), payloads (hash naam -> json)
+#   ARGV: maxlen, ttl, floor ('' = niet zetten), dan naam, timestamp, json, ...
+_ADD_SCRIPT = """
+local floor_member = '\\0floor'
+local maxlen, ttl = tonumber(ARGV[1]), tonumber(ARGV[2])
+if ARGV[3] ~= '' then
+    redis.call('ZADD', KEYS[1], 'GT', ARGV[3], floor_member)
+end
+for i = 4, #ARGV, 3 do
+    if redis.call('ZADD', KEYS[1], 'GT', 'CH', ARGV[i + 1], ARGV[i]) == 1 then
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+    end
+end
+local excess = redis.call('ZCARD', KEYS[1]) - maxlen
+if redis.call('ZSCORE', KEYS[1], floor_member) then
+    excess = excess - 1
+end
+if excess > 0 then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, excess, 'WITHSCORES')
+    local removed, floor = {}, nil
+    for i = 1, #oldest, 2 do
+        if oldest[i] ~= floor_member and #removed < excess then
+            table.insert(removed, oldest[i])
+            floor = oldest[i + 1]
+        end
+    end
+    redis.call('ZREM', KEYS[1], unpack(removed))
+    redis.call('HDEL', KEYS[2], unpack(removed))
+    redis.call('ZADD', KEYS[1], 'XX', 'GT', floor, floor_member)
+end
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+return excess
+"""
+
+
+class NotificationFeed:
+    """
+    Notificaties voor de /notifications-poll.
+
+    Met de 'db'-backend is dit de bekende query op Notification.timestamp.
+    Met 'redis' heeft elke gebruiker een sorted set (naam -> timestamp,
+    max. `maxlen` items) plus een hash met de payloads; een poll is dan één
+    pipeline (ZSCORE + ZRANGEBYSCORE) en alleen bij nieuwe notificaties een
+    HMGET. De cursor is dezelfde `since`-float als voorheen.
+
+    De database blijft de bron: add_notification schrijft nog steeds de rij,
+    en na de commit gaan alle nieuwe notificaties in één pipeline naar Redis.
+    Ontbreekt de feed (nieuw, verlopen of ge-evict), of vraagt een client van
+    vóór het afgeknipte deel, dan antwoorden we uit de database en vullen we
+    de feed opnieuw.
+    """
+
+    def __init__(self):
+        self._redis = None
+        self._script = None
+        self.enabled = False
+        self.maxlen = 100
+        self.ttl = 7 * 86400
+
+    def init_app(self, app):
+        self.enabled = app.config['NOTIFICATION_BACKEND'] == 'redis'
+        self.maxlen = app.config['NOTIFICATION_FEED_MAXLEN']
+        self.ttl = app.config['NOTIFICATION_FEED_TTL']
+        if self.enabled:
+            self._redis = app.redis
+            self._script = app.redis.register_script(_ADD_SCRIPT)
+            self._install_session_hooks()
+
+    @staticmethod
+    def _keys(user_id):
+        return f'notifications:{user_id}', f'notifications:{user_id}:data'
+
+    # ------------------------------------------------------------------
+    # Lezen
+    # ------------------------------------------------------------------
+    def since(self, user_id, since):
+        """Notificaties van `user_id` met timestamp > `since`, oudste eerst, als dicts."""
+        if not self.enabled:
+            return [_as_dict(n) for n in self._query(user_id, since)]
+        try:
+            feed = self._read(user_id, since)
+        except Exception as e:
+            logger.error("Notificatie-feed van gebruiker %s niet leesbaar: %s", user_id, e)
+            return [_as_dict(n) for n in self._query(user_id, since)]
+        if feed is not None:
+            return feed
+        return self._rebuild(user_id, since)
+
+    def _read(self, user_id, since):
+        """De feed uit Redis, of None als die ontbreekt of `since` niet dekt."""
+        feed_key, data_key = self._keys(user_id)
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zscore(feed_key, FLOOR)
+        pipe.zrangebyscore(feed_key, f'({since!r}', '+inf', withscores=True)
+        floor, entries = pipe.execute()
+        if floor is None or since < floor:
+            return None
+        names = [name for name, _ in entries if name != FLOOR.encode()]
+        if not names:
+            return []
+        payloads = self._redis.hmget(data_key, names)
+        if any(payload is None for payload in payloads):
+            # Hash los van de sorted set kwijtgeraakt: opnieuw opbouwen
+            self._redis.delete(feed_key, data_key)
+            return None
+        timestamps = dict(entries)
+        return [
+            {'name': name.decode(), 'data': json.loads(payload), 'timestamp': timestamps[name]}
+            for name, payload in zip(names, payloads)
+        ]
+
+    def _rebuild(self, user_id, since):
+        """Vul de feed uit de database en beantwoord de poll met dezelfde rijen."""
+        Notification = _notification_model()
+        rows = db.session.scalars(
+            sa.select(Notification)
+            .where(Notification.user_id == user_id)
+            .order_by(Notification.timestamp.desc())
+            .limit(self.maxlen + 1)
+        ).all()
+        floor = '-inf'
+        if len(rows) > self.maxlen:
+            floor = repr(rows.pop().timestamp)
+        try:
+            self._add(user_id, [(n.name, n.timestamp, n.payload_json) for n in rows], floor)
+        except Exception as e:
+            logger.error("Notificatie-feed van gebruiker %s niet opgebouwd: %s", user_id, e)
+        if floor != '-inf' and since < float(floor):
+            return [_as_dict(n) for n in self._query(user_id, since)]
+        return [_as_dict(n) for n in reversed(rows) if n.timestamp > since]
+
+    @staticmethod
+    def _query(user_id, since):
+        Notification = _notification_model()
+        return db.session.scalars(
+            sa.select(Notification)
+            .where(Notification.user_id == user_id, Notification.timestamp > since)
+            .order_by(Notification.timestamp.asc())
+        )
+
+    # ------------------------------------------------------------------
+    # Schrijven
+    # ------------------------------------------------------------------
+    def _add(self, user_id, items, floor='', client=None):
+        args = [self.maxlen, self.ttl, floor]
+        for name, timestamp, payload_json in items:
+            args.extend((name, repr(timestamp), payload_json))
+        self._script(keys=self._keys(user_id), args=args, client=client)
+
+    def publish_many(self, notifications):
+        """Zet [(user_id, naam, timestamp, json), ...] in één pipeline in de feeds."""
+        if not notifications:
+            return
+        per_user = {}
+        for user_id, name, timestamp, payload_json in notifications:
+            per_user.setdefault(user_id, []).append((name, timestamp, payload_json))
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for user_id, items in per_user.items():
+                self._add(user_id, items, client=pipe)
+            pipe.execute()
+        except Exception as e:
+            # De rijen staan in de database; laat de feeds opnieuw opbouwen
+            logger.error("Kon %d notificaties niet in Redis zetten: %s", len(notifications), e)
+            try:
+                self._redis.delete(*[key for user_id in per_user for key in self._keys(user_id)])
+            except Exception:
+                pass
+
+    def _install_session_hooks(self):
+        if event.contains(so.Session, 'after_flush', _collect_notifications):
+            return
+        event.listen(so.Session, 'after_flush', _collect_notifications)
+        event.listen(so.Session, 'after_commit', _publish_notifications)
+        event.listen(so.Session, 'after_rollback', _discard_notifications)
+
+
+def _notification_model():
+    from app.models import Notification
+    return Notification
+
+
+def _as_dict(notification):
+    return {'name': notification.name, 'data': notification.get_data(), 'timestamp': notification.timestamp}
+
+
+def _collect_notifications(session, flush_context):
+    Notification = _notification_model()
+    pending = None
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            if pending is None:
+                pending = session.info.setdefault('feed_notifications', [])
+            pending.append((obj.user_id, obj.name, obj.timestamp, obj.payload_json))
+
+
+def _publish_notifications(session):
+    notifications = session.info.pop('feed_notifications', None)
+    if notifications:
+        notification_feed.publish_many(notifications)
+
+
+def _discard_notifications(session):
+    session.info.pop('feed_notifications', None)
+
+
+notification_feed = NotificationFeed()
@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from app import db
+
+
+class KeysetPage:
+    """
+    Eén pagina uit keyset_paginate. Heeft dezelfde items/has_next/has_prev
+    als een Flask-SQLAlchemy Pagination, maar met cursors in plaats van
+    paginanummers en zonder totaal (geen COUNT(*)).
+    """
+
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _encode_cursor(direction, columns, item):
+    values = []
+    for column in columns:
+        value = getattr(item, column.key)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    raw = json.dumps({'d': direction, 'k': values}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, columns):
+    # Een ongeldige of gemanipuleerde cursor levert gewoon de eerste pagina op
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, values = data['d'], data['k']
+        if direction not in ('n', 'p') or len(values) != len(columns):
+            return None
+        keys = []
+        for column, value in zip(columns, values):
+            if isinstance(column.type, sa.DateTime):
+                value = datetime.fromisoformat(value)
+            keys.append(value)
+        return direction, keys
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _after(columns, keys, descending):
+    """Lexicografische vergelijking (a, b) > (x, y), zonder row values."""
+    column, key = columns[0], keys[0]
+    beyond = column < key if descending else column > key
+    if len(columns) == 1:
+        return beyond
+    return sa.or_(beyond, sa.and_(column == key, _after(columns[1:], keys[1:], descending)))
+
+
+def keyset_paginate(query, order_by, cursor=None, per_page=25, descending=False):
+    """
+    Pagineer `query` op de kolommen in `order_by` (bijv. timestamp, id; de
+    laatste kolom moet uniek zijn). Diepe pagina's blijven even snel omdat er
+    geen OFFSET is; `cursor` is een opaque token uit een vorige KeysetPage.
+    """
+    decoded = _decode_cursor(cursor, order_by) if cursor else None
+    direction, keys = decoded if decoded else ('n', None)
+
+    # Terugbladeren = de andere kant op sorteren en het resultaat omdraaien
+    reverse = descending if direction == 'n' else not descending
+    query = query.order_by(None).order_by(
+        *[column.desc() if reverse else column.asc() for column in order_by]
+    )
+    if keys is not None:
+        query = query.where(_after(order_by, keys, reverse))
+
+    items = list(db.session.scalars(query.limit(per_page + 1)).unique())
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    if direction == 'p':
+        items.reverse()
+
+    if not items:
+        return KeysetPage([], None, None)
+
+    if direction == 'n':
+        has_next, has_prev = has_more, keys is not None
+    else:
+        has_next, has_prev = True, has_more
+    return KeysetPage(
+        items,
+        _encode_cursor('n', order_by, items[-1]) if has_next else None,
+        _encode_cursor('p', order_by, items[0]) if has_prev else None,
+    )
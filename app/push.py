@@ -0,0 +1,243 @@
+import json
+import logging
+import queue
+import threading
+
+import sqlalchemy.orm as so
+from flask import has_request_context
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'push:'
+
+
+def family_channel(family_id):
+    return f'family:{family_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def _id_key(event_id):
+    # Redis stream-id 'ms-seq' -> vergelijkbare tuple
+    ms, _, seq = event_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+class PushHub:
+    """
+    Push-kanaal voor de chat en notificaties via server-sent events.
+
+    Elk event gaat naar twee plekken in Redis:
+    - een capped stream per kanaal (XADD MAXLEN ~), voor replay na een reconnect
+      met Last-Event-ID; het stream-id is tegelijk het SSE event-id;
+    - pub/sub, voor directe aflevering. Per worker luistert één thread op
+      'push:*' en verdeelt de berichten over de lokale abonnees, zodat een
+      open verbinding geen eigen Redis-connectie en geen DB-sessie vasthoudt.
+
+    Alle streams staan op dezelfde Redis-server, dus de ids (milliseconden-
+    seq) zijn over kanalen heen op volgorde te vergelijken.
+    """
+
+    def __init__(self):
+        self._redis = None
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._listener = None
+        self.stream_maxlen = 1000
+        self.heartbeat = 15
+        self.replay_limit = 200
+
+    def init_app(self, app):
+        self._redis = app.redis
+        self.stream_maxlen = app.config['PUSH_STREAM_MAXLEN']
+        self.heartbeat = app.config['PUSH_HEARTBEAT']
+        self.replay_limit = app.config['PUSH_REPLAY_LIMIT']
+        self._install_session_hooks()
+
+    # ------------------------------------------------------------------
+    # Publiceren
+    # ------------------------------------------------------------------
+    def publish_many(self, events):
+        """Publiceer [(kanaal, eventnaam, data), ...] in één pipeline."""
+        if not events:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            for channel, name, data in events:
+                pipe.xadd(PREFIX + channel, {'event': name, 'data': json.dumps(data)},
+                          maxlen=self.stream_maxlen, approximate=True)
+            ids = pipe.execute()
+            pipe = self._redis.pipeline(transaction=False)
+            for (channel, name, data), event_id in zip(events, ids):
+                event_id = event_id.decode() if isinstance(event_id, bytes) else event_id
+                pipe.publish(PREFIX + channel, json.dumps(
+                    {'id': event_id, 'event': name, 'data': data}
+                ))
+            pipe.execute()
+        except Exception as e:
+            # Push is best effort: de commit is al gelukt, clients halen het bij reload op
+            logger.error("Kon %d push-events niet publiceren: %s", len(events), e)
+
+    def publish(self, channel, name, data):
+        self.publish_many([(channel, name, data)])
+
+    def _install_session_hooks(self):
+        # Nieuwe Posts en Notifications pas na een geslaagde commit versturen
+        if event.contains(so.Session, 'after_flush', _collect_events):
+            return
+        event.listen(so.Session, 'after_flush', _collect_events)
+        event.listen(so.Session, 'after_commit', _publish_collected)
+        event.listen(so.Session, 'after_rollback', _discard_collected)
+
+    # ------------------------------------------------------------------
+    # Abonneren
+    # ------------------------------------------------------------------
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            # Lazy gestart, zodat elke (geforkte) worker zijn eigen listener heeft
+            self._listener = threading.Thread(target=self._listen, name='push-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(PREFIX + '*')
+                for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    channel = (channel.decode() if isinstance(channel, bytes) else channel)[len(PREFIX):]
+                    self._dispatch(channel, json.loads(message['data']))
+            except Exception as e:
+                logger.error("Push-listener verloor de verbinding met Redis: %s", e)
+                threading.Event().wait(1)
+
+    def _dispatch(self, channel, message):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for q in targets:
+            try:
+                q.put_nowait((channel, message))
+            except queue.Full:
+                # Een trage client loopt niet vol: hij haalt het bij de reconnect via replay op
+                logger.warning("Push-wachtrij vol voor kanaal %s", channel)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({id(q) for subs in self._subscribers.values() for q in subs})
+
+    def _replay(self, channels, last_event_id):
+        """Events na `last_event_id` uit de streams, op volgorde van id."""
+        events = []
+        for channel in channels:
+            for event_id, fields in self._redis.xrange(
+                PREFIX + channel, min=f'({last_event_id}', count=self.replay_limit
+            ):
+                event_id = event_id.decode() if isinstance(event_id, bytes) else event_id
+                fields = {(k.decode() if isinstance(k, bytes) else k): v for k, v in fields.items()}
+                events.append((channel, {
+                    'id': event_id,
+                    'event': fields['event'].decode() if isinstance(fields['event'], bytes) else fields['event'],
+                    'data': json.loads(fields['data']),
+                }))
+        events.sort(key=lambda item: _id_key(item[1]['id']))
+        return events
+
+    def subscribe(self, channels, last_event_id=None):
+        """
+        Generator met SSE-regels voor `channels`. Registreert zich eerst voor
+        live berichten en speelt daarna de gemiste events af, zodat er niets
+        tussen replay en live verloren gaat; dubbelen worden overgeslagen.
+        """
+        try:
+            baseline = _id_key(last_event_id) if last_event_id else None
+        except ValueError:
+            baseline = None
+        self._ensure_listener()
+
+        def stream():
+            q = queue.Queue(maxsize=1000)
+            with self._lock:
+                for channel in channels:
+                    self._subscribers.setdefault(channel, set()).add(q)
+            delivered = dict.fromkeys(channels, baseline or (0, 0))
+            try:
+                yield 'retry: 3000\n\n'
+                if baseline is not None:
+                    for channel, message in self._replay(channels, last_event_id):
+                        delivered[channel] = _id_key(message['id'])
+                        yield _format(message)
+                while True:
+                    try:
+                        channel, message = q.get(timeout=self.heartbeat)
+                    except queue.Empty:
+                        # Houdt proxies en de verbinding open; detecteert vertrokken clients
+                        yield ': ping\n\n'
+                        continue
+                    key = _id_key(message['id'])
+                    if key <= delivered[channel]:
+                        continue
+                    delivered[channel] = key
+                    yield _format(message)
+            finally:
+                with self._lock:
+                    for channel in channels:
+                        subs = self._subscribers.get(channel)
+                        if subs is not None:
+                            subs.discard(q)
+                            if not subs:
+                                del self._subscribers[channel]
+
+        return stream()
+
+
+def _format(message):
+    return f"id: {message['id']}\nevent: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+def _post_payload(post):
+    payload = {
+        'id': post.id,
+        'family_id': post.family_id,
+        'body': post.body,
+        'timestamp': post.timestamp.isoformat() if post.timestamp else None,
+        'author_id': post.user_id,
+        'author': post.author.username if post.author else None,
+    }
+    if has_request_context() and post.author is not None:
+        payload['avatar'] = post.author.avatar(32)
+        payload['avatar_jpg'] = post.author.avatar(32, 'jpg')
+    return payload
+
+
+def _collect_events(session, flush_context):
+    from app.models import Post, Notification
+    pending = session.info.setdefault('push_events', [])
+    for obj in session.new:
+        if isinstance(obj, Post) and obj.family_id is not None:
+            pending.append((family_channel(obj.family_id), 'post', _post_payload(obj)))
+        elif isinstance(obj, Notification):
+            pending.append((user_channel(obj.user_id), 'notification', {
+                'name': obj.name, 'data': obj.get_data(), 'timestamp': obj.timestamp,
+            }))
+
+
+def _publish_collected(session):
+    events = session.info.pop('push_events', None)
+    if events:
+        hub.publish_many(events)
+
+
+def _discard_collected(session):
+    session.info.pop('push_events', None)
+
+
+hub = PushHub()
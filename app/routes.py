@@ -1,58 +1,53 @@
 import os
 import secrets
+import time
 import uuid
 from zoneinfo import ZoneInfo
 
 from flask import session, render_template, flash, redirect, url_for, request, jsonify, abort, send_from_directory, \
-    current_app, Response
+    current_app, Response, send_file, g
 from urllib.parse import urlparse, urljoin
 import sqlalchemy as sa
+import sqlalchemy.orm as so
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
 
 from app import db, oauth
 from app.forms import (
     PostForm, EditProfileForm, EmptyForm, MessageForm,
-    FamilyForm, InviteForm, JoinForm, EditFamilyForm
+    FamilyForm, InviteForm, JoinForm, EditFamilyForm, SearchForm
 )
 from app.models import (
-    User, Post, Message, Notification,
+    User, Post, Message,
     Family, Membership, FamilyInvite
 )
+from app.identity import get_current_user, forget_current_user
+from app.last_seen import tracker as last_seen_tracker
+from app.pagination import keyset_paginate
+from app.image_store import image_store, is_valid_key, mimetype_for
+from app.avatars import process_upload, ensure_variant, InvalidImage
+from app.push import hub as push_hub, family_channel, user_channel
+from app.notifications import notification_feed
+from app.search import search_posts, search_messages
+from app.db_metrics import pool_status
 import logging
 from datetime import datetime, timezone, timedelta
 from requests.exceptions import HTTPError
 
-from flask_mail import Message as MailMessage
-from app import mail
+from app.email import queue_email, queue_emails, requeue_dead_letters
+from app.invites import (
+    normalize_emails, create_invites, latest_active_invite, invite_problem, redeem_invite,
+    JOINED, ALREADY_MEMBER, INVALID, EXPIRED, USED
+)
 
-# Configureer logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def get_current_user():
-    """
-    Haal de momenteel ingelogde gebruiker op via Auth0-sub uit de sessie.
-    Retourneert None als er geen geldige sessie is.
-    """
-    if 'user' not in session:
-        logger.debug("No user in session")
-        return None
-
-    user_info = session['user'].get('userinfo', {})
-    logger.debug(f"User info: {user_info}")
-
-    sub = user_info.get('sub')
-    if not sub:
-        logger.error("No sub found in user info, cannot identify user")
-        return None
-
-    user = db.session.scalar(sa.select(User).where(User.sub == sub))
-    if not user:
-        logger.debug("User not found in database, should have been created in callback")
-        return None
-
-    logger.debug(f"Found user with sub: {sub}")
-    return user
+# Melding en categorie per reden waarom een invite niet te gebruiken is
+INVITE_PROBLEMS = {
+    INVALID: ('Invalid invite token.', 'danger'),
+    EXPIRED: ('This invite has expired.', 'warning'),
+    USED: ('This invite was already used.', 'warning'),
+}
 
 def register_routes(app):
     """
@@ -61,16 +56,20 @@ def register_routes(app):
 
     @app.context_processor
     def inject_current_user():
-        # Maak get_current_user beschikbaar in alle templates
+        # Maak get_current_user beschikbaar in alle templates;
+        # de gebruiker wordt per request maar één keer opgezocht (zie app.identity)
         return dict(get_current_user=get_current_user)
 
     @app.before_request
     def before_request():
-        # Update last_seen voor ingelogde gebruiker
+        # Afbeeldingen, statische bestanden, health checks en metrics hebben geen gebruiker nodig
+        if request.endpoint in ('static', 'profile_image_file', 'healthz_db', 'metrics'):
+            return
+        # Registreer activiteit; last_seen wordt gebundeld weggeschreven (zie app.last_seen)
         user = get_current_user()
         if user:
-            user.last_seen = datetime.now(timezone.utc)
-            db.session.commit()
+            last_seen_tracker.touch(user)
+            g.search_form = SearchForm()
 
     # ------------------------------------------------------------------
     # 1) CREATE A FAMILY
@@ -90,6 +89,11 @@ def register_routes(app):
             .all()
         )
 
+        # Wie van de leden volgt de gebruiker al? Eén query voor alle families samen
+        following = current_user.following_among(
+            {member.user_id for family in families for member in family.memberships}
+        )
+
         form = FamilyForm()
         if form.validate_on_submit():
             # Maak nieuwe Family en voeg creator toe als lid
@@ -103,7 +107,7 @@ def register_routes(app):
             flash(f'Family "{fam.name}" created!', 'success')
             return redirect(url_for('invite_family', family_id=fam.id))
 
-        return render_template('create_family.html', form=form, families=families)
+        return render_template('create_family.html', form=form, families=families, following=following)
 
     # ------------------------------------------------------------------
     # 2) GENERATE AN INVITE
@@ -145,7 +149,8 @@ def register_routes(app):
             # stuur een email met de token
             if form.invited_email.data:
                 join_url = url_for('join_family', token=invite.token, _external=True)
-                msg = MailMessage(
+                # Op de achtergrond versturen (zie app.email), niet in het request
+                queued = queue_email(
                     subject=f"FamPlan: Invite to join “{fam.name}”",
                     recipients=[invite.invited_email],
                     body=render_template(
@@ -155,19 +160,16 @@ def register_routes(app):
                         expires_at=invite.expires_at
                     )
                 )
-                mail.send(msg)
-                flash(f'Invite sent to {invite.invited_email}', 'success')
+                if queued:
+                    flash(f'Invite sent to {invite.invited_email}', 'success')
+                else:
+                    flash('The invite email could not be sent; share the link below instead.', 'warning')
 
             else:
                 flash('Invite created! No email address provided so no message sent.', 'info')
 
-        # Toon de meest recente invite
-        latest = (
-            FamilyInvite.query
-            .filter_by(family_id=fam.id)
-            .order_by(FamilyInvite.created_at.desc())
-            .first()
-        )
+        # Toon de meest recente invite die nog te gebruiken is
+        latest = latest_active_invite(fam.id)
         join_url = (
             url_for('join_family', token=latest.token, _external=True)
             if latest else None
@@ -182,6 +184,62 @@ def register_routes(app):
             expires_at = (latest.expires_at if latest else None)
         )
 
+    @app.route('/family/<int:family_id>/invites', methods=['POST'])
+    def invite_family_bulk(family_id):
+        """
+        Nodig een lijst adressen in één keer uit: {"emails": [...]}. Adressen
+        met een openstaande invite krijgen die opnieuw (geen nieuwe mail),
+        de rest een nieuwe invite; alle mails gaan als één batch naar rq.
+        """
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({'error': 'Not logged in'}), 403
+        fam = db.get_or_404(Family, family_id)
+        if not any(m.user_id == current_user.id for m in fam.memberships):
+            abort(403)
+
+        data = request.get_json(silent=True) or {}
+        emails = data.get('emails')
+        if not isinstance(emails, list) or not emails:
+            return jsonify({'error': 'A non-empty list of emails is required'}), 400
+        if len(emails) > app.config['INVITE_BULK_MAX']:
+            return jsonify({'error': f"At most {app.config['INVITE_BULK_MAX']} emails per request"}), 400
+
+        emails, invalid = normalize_emails(emails)
+        invites = create_invites(fam.id, emails)
+        db.session.commit()
+
+        for invite in invites:
+            invite['join_url'] = url_for('join_family', token=invite['token'], _external=True)
+        new = [invite for invite in invites if invite['created']]
+        queued = queue_emails([
+            {
+                'subject': f"FamPlan: Invite to join “{fam.name}”",
+                'recipients': [invite['email']],
+                'body': render_template(
+                    'email/family_invite.txt',
+                    family=fam,
+                    join_url=invite['join_url'],
+                    expires_at=invite['expires_at']
+                ),
+            }
+            for invite in new
+        ]) if new else True
+
+        return jsonify({
+            'invites': [
+                {
+                    'email': invite['email'],
+                    'join_url': invite['join_url'],
+                    'expires_at': invite['expires_at'].isoformat() if invite['expires_at'] else None,
+                    'created': invite['created'],
+                }
+                for invite in invites
+            ],
+            'invalid': invalid,
+            'emails_queued': queued,
+        }), 201 if new else 200
+
     # ------------------------------------------------------------------
     # 3) JOIN A FAMILY WITH A TOKEN
     # ------------------------------------------------------------------
@@ -195,56 +253,26 @@ def register_routes(app):
             flash('Please log in to join a family.', 'warning')
             return redirect(url_for('auth_login'))
 
-        # Load the invite by token
-        invite = FamilyInvite.query.filter_by(token=token).first()
-        if not invite:
-            flash('Invalid invite token.', 'danger')
-            return redirect(url_for('create_family'))
-
-        # Normalize and check expiration
-        now = datetime.now(timezone.utc)
-        exp = invite.expires_at
-        if exp:
-            if exp.tzinfo is None:
-                exp = exp.replace(tzinfo=timezone.utc)
-            if exp < now:
-                flash('This invite has expired.', 'warning')
-                return redirect(url_for('create_family'))
-
-        # Check if invite was already used
-        if invite.accepted:
-            flash('This invite was already used.', 'warning')
-            return redirect(url_for('create_family'))
-
         form = JoinForm(token=token)
         if form.validate_on_submit():
-            # Prevent the same user joining twice
-            already = db.session.scalar(
-                sa.select(Membership)
-                .where(
-                    Membership.user_id == current_user.id,
-                    Membership.family_id == invite.family_id
-                )
-            )
-            if already:
+            # Claimen en lid worden in één transactie; zie app.invites.redeem_invite
+            outcome, family_id = redeem_invite(token, current_user.id)
+            if outcome == JOINED:
+                fam = db.session.get(Family, family_id)
+                flash(f'You have joined “{fam.name}”!', 'success')
+                return redirect(url_for('calendar.index'))
+            if outcome == ALREADY_MEMBER:
                 flash("You’re already a member of this family.", "warning")
-                return redirect(url_for('invite_family', family_id=invite.family_id))
-
-            # All clear—create the membership
-            membership = Membership(
-                user_id=current_user.id,
-                family_id=invite.family_id
-            )
-            db.session.add(membership)
-
-            # Mark the invite as used
-            invite.accepted = True
-
-            # Commit both in one transaction
-            db.session.commit()
+                return redirect(url_for('invite_family', family_id=family_id))
+            flash(*INVITE_PROBLEMS[outcome])
+            return redirect(url_for('create_family'))
 
-            flash(f'You have joined “{invite.family.name}”!', 'success')
-            return redirect(url_for('calendar.index'))
+        # Load the invite by token (alleen om te tonen; inwisselen gebeurt hierboven)
+        invite = FamilyInvite.query.filter_by(token=token).first()
+        problem = invite_problem(invite)
+        if problem:
+            flash(*INVITE_PROBLEMS[problem])
+            return redirect(url_for('create_family'))
 
         return render_template('join_family.html', form=form, invite=invite)
 
@@ -329,7 +357,7 @@ def register_routes(app):
             received_state = request.args.get('state')
             expected_state = session.get('auth0_state')
             if received_state != expected_state:
-                logger.error(f"CSRF Warning: State mismatch. Received: {received_state}, Expected: {expected_state}")
+                logger.error("CSRF Warning: State mismatch. Received: %s, Expected: %s", received_state, expected_state)
                 session.clear()
                 return redirect(url_for('login', prompt='login'))
 
@@ -415,6 +443,7 @@ def register_routes(app):
 
     @app.route('/logout')
     def logout():
+        forget_current_user()
         session.clear()
         return redirect(
             f"https://{app.config['AUTH0_DOMAIN']}/v2/logout?"
@@ -451,20 +480,13 @@ def register_routes(app):
 
         # ——————————————————————————————————————————————————————————
         # 2) Build conversations overview
-        #    One entry per Family the user belongs to, plus its last Post
+        #    One entry per Family the user belongs to, plus its last Post,
+        #    fetched in a single query (see User.family_conversations)
         # ——————————————————————————————————————————————————————————
-        conversations = []
-        for fam in user.families:
-            last_post = db.session.scalar(
-                sa.select(Post)
-                .where(Post.family_id == fam.id)
-                .order_by(Post.timestamp.desc())
-                .limit(1)
-            )
-            conversations.append({
-                'family': fam,
-                'last_post': last_post
-            })
+        conversations = [
+            {'family': fam, 'last_post': last_post}
+            for fam, last_post in user.family_conversations()
+        ]
 
         # ——————————————————————————————————————————————————————————
         # 3) If no family_id → show conversations list
@@ -478,11 +500,14 @@ def register_routes(app):
         # 4) Otherwise: Chat mode for a specific family
         #    Verify the family exists and the user is a member
         # ——————————————————————————————————————————————————————————
-        current_family = db.session.get(Family, family_id)
+        current_family = next(
+            (c['family'] for c in conversations if c['family'].id == family_id),
+            None
+        )
         if not current_family:
-            abort(404)
-        # ensure membership
-        if not any(m.family_id == family_id for m in user.memberships):
+            # Not one of the user's families: distinguish unknown from forbidden
+            if db.session.get(Family, family_id) is None:
+                abort(404)
             abort(403)
 
         # ——————————————————————————————————————————————————————————
@@ -490,7 +515,7 @@ def register_routes(app):
         # ——————————————————————————————————————————————————————————
         form = PostForm()
         form.family.choices = [(-1, 'Only Me')] + [
-            (f.id, f.name) for f in user.families
+            (c['family'].id, c['family'].name) for c in conversations
         ]
         # Force the family field to the “current” chat
         form.family.data = current_family.id
@@ -509,15 +534,18 @@ def register_routes(app):
             return redirect(url_for('index', family_id=family_id))
 
         # ——————————————————————————————————————————————————————————
-        # 6) Paginate this family’s posts
+        # 6) Paginate this family’s posts (keyset on timestamp, id; no COUNT)
+        #    Nieuwste pagina eerst; 'next' bladert naar oudere berichten
         # ——————————————————————————————————————————————————————————
-        page = request.args.get('page', 1, type=int)
-        posts = db.paginate(
-            Post.query.filter_by(family_id=family_id),
-            page=page,
+        posts = keyset_paginate(
+            Post.chat_feed(family_id),
+            (Post.timestamp, Post.id),
+            cursor=request.args.get('cursor'),
             per_page=app.config['POSTS_PER_PAGE'],
-            error_out=False
+            descending=True
         )
+        # In de chat staat het oudste bericht bovenaan
+        posts.items.reverse()
 
         # ——————————————————————————————————————————————————————————
         # 7) Render the chat template
@@ -534,9 +562,9 @@ def register_routes(app):
             current_family=current_family,
             form=form,
             posts=posts.items,
-            next_url=url_for('index', family_id=family_id, page=posts.next_num)
+            next_url=url_for('index', family_id=family_id, cursor=posts.next_cursor)
             if posts.has_next else None,
-            prev_url=url_for('index', family_id=family_id, page=posts.prev_num)
+            prev_url=url_for('index', family_id=family_id, cursor=posts.prev_cursor)
             if posts.has_prev else None
         )
 
@@ -545,20 +573,23 @@ def register_routes(app):
         if 'user' not in session:
             return redirect(url_for('login'))
         user = db.first_or_404(sa.select(User).where(User.username == username))
-        page = request.args.get('page', 1, type=int)
-        query = user.posts.select().order_by(Post.timestamp.desc())
-        posts = db.paginate(
-            query, page=page,
-            per_page=app.config['POSTS_PER_PAGE'], error_out=False
+        last_seen_tracker.apply_pending(user)
+        current_user = get_current_user()
+        following = current_user.following_among([user.id]) \
+            if current_user and current_user != user else set()
+        posts = keyset_paginate(
+            user.posts.select(), (Post.timestamp, Post.id),
+            cursor=request.args.get('cursor'),
+            per_page=app.config['POSTS_PER_PAGE'], descending=True
         )
-        next_url = url_for('user', username=user.username, page=posts.next_num) \
+        next_url = url_for('user', username=user.username, cursor=posts.next_cursor) \
             if posts.has_next else None
-        prev_url = url_for('user', username=user.username, page=posts.prev_num) \
+        prev_url = url_for('user', username=user.username, cursor=posts.prev_cursor) \
             if posts.has_prev else None
         form = EmptyForm()
         return render_template(
-            'user.html', user=user, posts=posts.items,
-            next_url=next_url, prev_url=prev_url, form=form
+            'user.html', user=user, posts=posts.items, current_user=current_user,
+            following=following, next_url=next_url, prev_url=prev_url, form=form
         )
 
     @app.route('/edit_profile', methods=['GET', 'POST'])
@@ -575,15 +606,17 @@ def register_routes(app):
 
             # Verwerk de profielfoto als die is geüpload
             if form.profile_picture.data:
-                file = form.profile_picture.data
-                # Lees de binaire data
-                image_data = file.read()
-                # Sla de MIME-type op
-                mime_type = file.mimetype
-                # Sla de data op in de database
-                user.profile_image_data = image_data
-                user.profile_image_mime = mime_type
-
+                # Valideren, metadata strippen en thumbnails renderen; de DB bewaart alleen de sleutel
+                try:
+                    # De upload staat al gespoold (zie app.uploads); niet in zijn geheel inlezen
+                    user.profile_image, user.profile_image_mime = process_upload(
+                        image_store, form.profile_picture.data.stream
+                    )
+                except InvalidImage as e:
+                    logger.info("Ongeldige profielfoto van %s: %s", user.username, e)
+                    db.session.rollback()
+                    flash('This file is not a valid image.')
+                    return redirect(url_for('edit_profile'))
 
             db.session.commit()
             flash('Your changes have been saved.')
@@ -599,15 +632,42 @@ def register_routes(app):
 
     @app.route('/profile_image/<int:user_id>')
     def get_profile_image(user_id):
-        user = db.session.get(User, user_id)
-        if user and user.profile_image_data:
-            return Response(
-                user.profile_image_data,
-                mimetype=user.profile_image_mime
-            )
-        # Fallback naar een standaardafbeelding of Gravatar
+        # Oude, niet-cachebare URL: stuur door naar de huidige afbeelding
+        user = db.get_or_404(User, user_id)
         return redirect(user.avatar(128))
 
+    @app.route('/images/<key>')
+    def profile_image_file(key):
+        if not is_valid_key(key):
+            abort(404)
+
+        # De sleutel is de hash van de inhoud, dus ook een sterke ETag
+        if request.if_none_match.contains(key):
+            response = Response(status=304)
+        else:
+            path = image_store.path(key)
+            # Thumbnails van foto's van vóór de pipeline worden bij de eerste aanvraag gemaakt
+            if not os.path.isfile(path) and not ensure_variant(image_store, key):
+                abort(404)
+            accel_prefix = app.config['IMAGE_ACCEL_REDIRECT']
+            if accel_prefix:
+                # nginx serveert het bestand zelf (internal location)
+                response = Response(mimetype=mimetype_for(key))
+                response.headers['X-Accel-Redirect'] = \
+                    accel_prefix.rstrip('/') + '/' + image_store.relative_path(key).replace(os.sep, '/')
+            else:
+                # Met USE_X_SENDFILE laat send_file dit over aan Apache/lighttpd
+                response = send_file(
+                    path, mimetype=mimetype_for(key), etag=False, conditional=False,
+                    max_age=app.config['IMAGE_CACHE_MAX_AGE']
+                )
+
+        response.set_etag(key)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['IMAGE_CACHE_MAX_AGE']
+        response.cache_control.immutable = True
+        return response
+
     @app.route('/follow/<username>', methods=['POST'])
     def follow(username):
         if 'user' not in session:
@@ -654,14 +714,47 @@ def register_routes(app):
             return redirect(url_for('login'))
         current_user = get_current_user()
         since = request.args.get('since', 0.0, type=float)
-        query = current_user.notifications.select().where(
-            Notification.timestamp > since
-        ).order_by(Notification.timestamp.asc())
-        notifications = db.session.scalars(query)
-        return jsonify([
-            {'name': n.name, 'data': n.get_data(), 'timestamp': n.timestamp}
-            for n in notifications
-        ])
+        return jsonify(notification_feed.since(current_user.id, since))
+
+    @app.route('/stream')
+    def stream():
+        # Server-sent events: nieuwe posts in je families en je notificaties
+        current_user = get_current_user() if 'user' in session else None
+        if current_user is None:
+            abort(401)
+        family_ids = db.session.scalars(
+            sa.select(Membership.family_id).where(Membership.user_id == current_user.id)
+        ).all()
+        channels = [user_channel(current_user.id)] + [family_channel(f) for f in family_ids]
+        # Geen stream_with_context: de DB-sessie gaat na deze return terug naar de pool
+        return Response(
+            push_hub.subscribe(channels, request.headers.get('Last-Event-ID')),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.route('/search')
+    def search():
+        current_user = get_current_user() if 'user' in session else None
+        if current_user is None:
+            return redirect(url_for('login'))
+        form = g.get('search_form') or SearchForm()
+        if not form.validate():
+            return redirect(url_for('index'))
+        q = form.q.data
+        kind = 'messages' if request.args.get('kind') == 'messages' else 'posts'
+        family_id = request.args.get('family_id', type=int)
+        cursor = request.args.get('cursor')
+        per_page = app.config['POSTS_PER_PAGE']
+        # Ranking, paginering en het lidmaatschap zitten allemaal in de query (zie app.search)
+        if kind == 'messages':
+            page = search_messages(current_user.id, q, cursor=cursor, per_page=per_page)
+        else:
+            page = search_posts(current_user.id, q, family_id=family_id, cursor=cursor, per_page=per_page)
+        next_url = url_for('search', q=q, kind=kind, family_id=family_id,
+                           cursor=page.next_cursor) if page.has_next else None
+        return render_template('search.html', title='Search', q=q, kind=kind,
+                               family_id=family_id, results=page.items, next_url=next_url)
 
     @app.route('/send_message/<recipient>', methods=['GET', 'POST'])
     def send_message(recipient):
@@ -680,6 +773,10 @@ def register_routes(app):
                 body=form.message.data
             )
             db.session.add(msg)
+            recipient_user.receive_message()
+            # Na de flush is de teller opnieuw te lezen; de notificatie gaat na de commit naar /stream
+            db.session.flush()
+            recipient_user.add_notification('unread_message_count', recipient_user.unread_message_count())
             db.session.commit()
             flash('Your message has been sent.')
             return redirect(url_for('user', username=recipient))
@@ -690,6 +787,27 @@ def register_routes(app):
             recipient=recipient
         )
 
+    @app.route('/messages')
+    def messages():
+        if 'user' not in session:
+            return redirect(url_for('login'))
+        current_user = get_current_user()
+        # Lezen van de inbox zet last_message_read_time én de teller terug naar 0
+        current_user.mark_messages_read()
+        # Zet de badge in andere open tabs ook op 0
+        current_user.add_notification('unread_message_count', 0)
+        db.session.commit()
+        page = keyset_paginate(
+            current_user.messages_received.select().options(so.joinedload(Message.author)),
+            (Message.timestamp, Message.id),
+            cursor=request.args.get('cursor'),
+            per_page=app.config['POSTS_PER_PAGE'], descending=True
+        )
+        next_url = url_for('messages', cursor=page.next_cursor) if page.has_next else None
+        prev_url = url_for('messages', cursor=page.prev_cursor) if page.has_prev else None
+        return render_template('messages.html', title='Messages', messages=page.items,
+                               next_url=next_url, prev_url=prev_url)
+
     @app.route('/favicon.ico')
     def favicon():
         return send_from_directory(
@@ -723,10 +841,59 @@ def register_routes(app):
             screen_hint='signup'
         )
 
+    @app.route('/healthz/db')
+    def healthz_db():
+        # Voor load balancers en monitoring: bereikbaarheid van de database plus de poolstand
+        started = time.perf_counter()
+        try:
+            db.session.execute(sa.text('SELECT 1'))
+            ok, error = True, None
+        except Exception as e:
+            logger.error("Database health check mislukt: %s", e)
+            ok, error = False, type(e).__name__
+        finally:
+            db.session.rollback()
+        body = {
+            'status': 'ok' if ok else 'error',
+            'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+            'pool': pool_status(db.engine),
+        }
+        if error:
+            body['error'] = error
+        return jsonify(body), 200 if ok else 503
+
     @app.errorhandler(404)
     def page_not_found(error):
         return render_template('404.html'), 404
 
+    @app.errorhandler(RequestEntityTooLarge)
+    @app.errorhandler(UnsupportedMediaType)
+    def upload_rejected(error):
+        # Te groot of geen afbeelding: al geweigerd voordat de hele body gelezen is
+        if request.endpoint == 'edit_profile':
+            flash(error.description if isinstance(error, UnsupportedMediaType)
+                  else 'This file is too large.')
+            return redirect(url_for('edit_profile'))
+        return error
+
     @app.errorhandler(500)
     def internal_server_error(error):
         return render_template('500.html'), 500
+
+    # CLI: start de periodieke reconciliatie van tellers (draai een worker met --with-scheduler)
+    @app.cli.command('reconcile-counters')
+    def reconcile_counters_command():
+        job = app.task_queue.enqueue('app.tasks.reconcile_counters')
+        print(f"Reconciliatie van tellers ingepland (job {job.id})")
+
+    # CLI: start het periodiek opruimen van oude invites (draai een worker met --with-scheduler)
+    @app.cli.command('sweep-invites')
+    def sweep_invites_command():
+        job = app.task_queue.enqueue('app.tasks.sweep_invites')
+        print(f"Opruimen van invites ingepland (job {job.id})")
+
+    # CLI: e-mails uit de dead-letter-lijst opnieuw versturen (na het oplossen van de oorzaak)
+    @app.cli.command('requeue-dead-mail')
+    def requeue_dead_mail_command():
+        count = requeue_dead_letters(app.redis)
+        print(f"{count} e-mails opnieuw in de wachtrij gezet")
@@ -0,0 +1,149 @@
+import base64
+import json
+import logging
+import re
+
+import sqlalchemy as sa
+
+from app import db
+from app.pagination import KeysetPage, _after
+
+logger = logging.getLogger(__name__)
+
+# Zoekconfiguratie van PostgreSQL: 'simple' stemt niet en werkt dus voor
+# Nederlands en Engels door elkaar (moet gelijk zijn aan de migratie)
+TS_CONFIG = 'simple'
+
+# SQLite: FTS5-tabellen met 'external content' (alleen de index, de tekst
+# staat in post/message) en triggers die hem bij insert/update/delete bijwerken.
+# Staan niet in een migratie: een batch-migratie bouwt de tabel opnieuw op en
+# verliest dan zijn triggers; init_app zet ze bij het starten terug.
+_SQLITE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(body, content='{table}', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN"
+    " INSERT INTO {table}_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN"
+    " INSERT INTO {table}_fts({table}_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF body ON {table} BEGIN"
+    " INSERT INTO {table}_fts({table}_fts, rowid, body) VALUES ('delete', old.id, old.body);"
+    " INSERT INTO {table}_fts(rowid, body) VALUES (new.id, new.body); END",
+)
+_INDEXED_TABLES = ('post', 'message')
+
+
+def install_sqlite_fts(connection):
+    """Maak de FTS5-index en triggers aan waar ze ontbreken; een nieuwe index wordt gevuld."""
+    inspector = sa.inspect(connection)
+    existing = set(inspector.get_table_names())
+    for table in _INDEXED_TABLES:
+        if table not in existing:
+            continue
+        triggers = {row[0] for row in connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table,)
+        )}
+        if f'{table}_fts' in existing and f'{table}_fts_insert' in triggers:
+            continue
+        for statement in _SQLITE_FTS:
+            connection.exec_driver_sql(statement.format(table=table))
+        # Index opnieuw opbouwen: nieuw, of de triggers waren weg en hij kan achterlopen
+        connection.exec_driver_sql(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+        logger.info("Zoekindex voor %s opgebouwd", table)
+
+
+def init_app(app):
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.begin() as connection:
+                install_sqlite_fts(connection)
+
+
+def _fts5_query(q):
+    # Alleen woorden, elk als los gequote term: geen FTS5-syntax of -fouten uit gebruikersinvoer
+    terms = re.findall(r'\w+', q)
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _matches(model, q):
+    """
+    select(id, rank) van de rijen van `model` die op `q` matchen, hoogste
+    rank het best. Geeft None als er niets te zoeken valt.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        query = sa.func.websearch_to_tsquery(TS_CONFIG, q)
+        vector = sa.literal_column(f'{table.name}.search_vector')
+        return sa.select(model.id.label('id'), sa.func.ts_rank_cd(vector, query).label('rank')).where(
+            vector.op('@@')(query)
+        )
+    if dialect == 'sqlite':
+        match = _fts5_query(q)
+        if not match:
+            return None
+        fts = sa.table(f'{table.name}_fts', sa.column('rowid'))
+        return (
+            sa.select(model.id.label('id'), (-sa.func.bm25(sa.literal_column(fts.name))).label('rank'))
+            .join(fts, fts.c.rowid == model.id)
+            .where(sa.literal_column(fts.name).op('MATCH')(match))
+        )
+    # Andere databases: geen index, dus een scan zonder ranking
+    return sa.select(model.id.label('id'), sa.literal(0.0).label('rank')).where(model.body.contains(q))
+
+
+def _encode_cursor(rank, item_id):
+    raw = json.dumps([rank, item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        rank, item_id = json.loads(base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode()))
+        return float(rank), int(item_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def _ranked_page(model, hits, cursor, per_page):
+    """
+    Pagina van `model` uit `hits` (select van id + rank), beste eerst. Keyset
+    op (rank, id) zoals keyset_paginate, maar alleen vooruit: bij zoeken
+    bladeren gebruikers door naar 'meer resultaten'.
+    """
+    hits = hits.subquery()
+    query = sa.select(model, hits.c.rank).join(hits, hits.c.id == model.id)
+    keys = _decode_cursor(cursor) if cursor else None
+    if keys is not None:
+        query = query.where(_after([hits.c.rank, hits.c.id], list(keys), descending=True))
+    rows = db.session.execute(
+        query.order_by(hits.c.rank.desc(), hits.c.id.desc()).limit(per_page + 1)
+    ).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    items = [item for item, _ in rows]
+    next_cursor = _encode_cursor(rows[-1][1], rows[-1][0].id) if has_next else None
+    return KeysetPage(items, next_cursor, None)
+
+
+def search_posts(user_id, q, family_id=None, cursor=None, per_page=25):
+    """Chatposts in de families van `user_id` die op `q` matchen (optioneel in één familie)."""
+    from app.models import Post, Membership
+    hits = _matches(Post, q)
+    if hits is None:
+        return KeysetPage([], None, None)
+    # Het lidmaatschap zit in de query: alleen families waar de gebruiker lid van is
+    hits = hits.join(Membership, sa.and_(
+        Membership.family_id == Post.family_id, Membership.user_id == user_id
+    ))
+    if family_id is not None:
+        hits = hits.where(Post.family_id == family_id)
+    return _ranked_page(Post, hits, cursor, per_page)
+
+
+def search_messages(user_id, q, cursor=None, per_page=25):
+    """Privéberichten van of aan `user_id` die op `q` matchen."""
+    from app.models import Message
+    hits = _matches(Message, q)
+    if hits is None:
+        return KeysetPage([], None, None)
+    hits = hits.where(sa.or_(Message.sender_id == user_id, Message.recipient_id == user_id))
+    return _ranked_page(Message, hits, cursor, per_page)
@@ -0,0 +1,88 @@
+import logging
+from datetime import timedelta
+
+from app import create_app, db
+from app.calendar_credentials import credentials_manager
+from app.counters import reconcile_unread_messages, reconcile_follow_counts
+from app.email import deliver, dead_letter, retry_delay
+from app.invites import sweep_invites as purge_invites
+
+# RQ-jobs draaien buiten een request; geef ze een eigen app-context
+app = create_app()
+app.app_context().push()
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_calendar_tokens(reschedule=True):
+    """
+    Ververs Google-tokens kort voordat ze verlopen, zodat requests zelden
+    zelf op een refresh hoeven te wachten. Plant zichzelf opnieuw in
+    (vereist een worker met --with-scheduler).
+    """
+    try:
+        lookahead = timedelta(seconds=app.config['CALENDAR_TOKEN_REFRESH_LOOKAHEAD'])
+        valid = credentials_manager.refresh_expiring(lookahead)
+        logger.info("Agendatokens gecontroleerd, %d geldig", valid)
+    finally:
+        db.session.remove()
+        if reschedule:
+            app.task_queue.enqueue_in(
+                timedelta(seconds=app.config['CALENDAR_TOKEN_REFRESH_INTERVAL']),
+                'app.tasks.refresh_calendar_tokens'
+            )
+
+
+def reconcile_counters(reschedule=True):
+    """
+    Herstel de bijgehouden tellers (zie app.counters) uit de brongegevens,
+    zodat drift niet blijft hangen. Plant zichzelf opnieuw in.
+    """
+    try:
+        reconcile_unread_messages(app.config['COUNTER_RECONCILE_BATCH'])
+        reconcile_follow_counts(app.config['COUNTER_RECONCILE_BATCH'])
+    finally:
+        db.session.remove()
+        if reschedule:
+            app.task_queue.enqueue_in(
+                timedelta(seconds=app.config['COUNTER_RECONCILE_INTERVAL']),
+                'app.tasks.reconcile_counters'
+            )
+
+
+def sweep_invites(reschedule=True):
+    """
+    Verwijder verlopen en geaccepteerde invites na INVITE_RETENTION_DAYS
+    (zie app.invites.sweep_invites). Plant zichzelf opnieuw in.
+    """
+    try:
+        purge_invites(
+            timedelta(days=app.config['INVITE_RETENTION_DAYS']),
+            app.config['INVITE_SWEEP_BATCH'],
+        )
+    finally:
+        db.session.remove()
+        if reschedule:
+            app.task_queue.enqueue_in(
+                timedelta(seconds=app.config['INVITE_SWEEP_INTERVAL']),
+                'app.tasks.sweep_invites'
+            )
+
+
+def send_email_batch(messages, attempt=0):
+    """
+    Verstuur een batch e-mails (zie app.email.queue_emails). Wat door een
+    SMTP-storing blijft liggen gaat met exponentiële backoff opnieuw in de
+    wachtrij; na MAIL_MAX_ATTEMPTS pogingen, of bij een permanente weigering,
+    belandt het in de dead-letter-lijst.
+    """
+    remaining, permanent, error = deliver(messages)
+    for message, reason in permanent:
+        dead_letter(app.redis, message, reason, attempt + 1)
+    if not remaining:
+        return
+    if attempt + 1 >= app.config['MAIL_MAX_ATTEMPTS']:
+        for message in remaining:
+            dead_letter(app.redis, message, error, attempt + 1)
+        return
+    app.task_queue.enqueue_in(retry_delay(attempt), 'app.tasks.send_email_batch', remaining, attempt + 1)
@@ -0,0 +1,59 @@
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import UnsupportedMediaType
+
+# Genoeg bytes om alle ondersteunde formaten te herkennen (WebP: 'RIFF....WEBP')
+SNIFF_BYTES = 12
+
+
+def sniff_image_type(head):
+    """Herken een afbeelding aan de eerste bytes; None als het geen ondersteund formaat is."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class ImageUploadStream(tempfile.SpooledTemporaryFile):
+    """
+    Doel voor een geüpload bestand tijdens het parsen van de multipart-body.
+    Kleine bestanden blijven in het geheugen, grotere gaan naar een tijdelijk
+    bestand. Zodra de eerste bytes binnen zijn controleren we of het een
+    afbeelding is; zo niet, dan stopt het parsen meteen met een 415 en wordt
+    de rest van de body niet meer gelezen.
+    """
+
+    def __init__(self, max_size):
+        super().__init__(max_size=max_size, mode='w+b')
+        self._head = b''
+        self.mimetype = None
+
+    def write(self, data):
+        if self.mimetype is None:
+            self._head += bytes(data[:SNIFF_BYTES])
+            if len(self._head) >= SNIFF_BYTES:
+                self.mimetype = sniff_image_type(self._head)
+                if self.mimetype is None:
+                    raise UnsupportedMediaType('Only JPEG, PNG, GIF and WebP images can be uploaded.')
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    """
+    Request-klasse die bestandsuploads door ImageUploadStream laat lopen.
+    De app accepteert alleen afbeeldingen als upload (profielfoto's); de
+    totale grootte wordt door MAX_CONTENT_LENGTH begrensd voordat er iets
+    gelezen wordt.
+    """
+
+    # Bestanden groter dan dit gaan naar schijf in plaats van het werkgeheugen
+    spool_max_size = 256 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return ImageUploadStream(self.spool_max_size)
@@ -6,12 +6,53 @@ ENV_FILE = find_dotenv()
 if ENV_FILE:
     load_dotenv(ENV_FILE)
 
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ['true', '1', 't']
+
+
+def engine_options(database_uri):
+    """
+    Engine-opties voor SQLAlchemy uit de omgeving. SQLite (ontwikkeling)
+    houdt de standaardinstellingen; voor een server-database stellen we de
+    pool in zodat workers x (pool_size + max_overflow) onder max_connections
+    van de database blijft. gunicorn.conf.py zet ruimere standaarden voor gevent.
+    """
+    if not database_uri or database_uri.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        # Verbindingen verversen voordat de server of een firewall ze stilletjes sluit
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', 'true'),
+    }
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if database_uri.startswith('postgres') and statement_timeout:
+        # Een op hol geslagen query houdt geen verbinding (en worker) vast
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
 class Config:
     SECRET_KEY = os.getenv('APP_SECRET_KEY')
     # SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(basedir, 'instance', 'app.db')}"
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     print(f"Config SQLALCHEMY_DATABASE_URI: {SQLALCHEMY_DATABASE_URI}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    # Queries en pool-checkouts die langer duren dan dit worden gelogd (ms)
+    DB_SLOW_QUERY_MS = int(os.getenv('DB_SLOW_QUERY_MS', 500))
+    DB_POOL_WAIT_WARN_MS = int(os.getenv('DB_POOL_WAIT_WARN_MS', 100))
+    # Logging: niveau, formaat ('json' of 'text') en het deel van de DEBUG-regels dat gelogd wordt
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 1.0))
+    LOG_QUIET_LOGGERS = [name for name in os.getenv(
+        'LOG_QUIET_LOGGERS', 'urllib3,googleapiclient,google_auth_httplib2,authlib'
+    ).split(',') if name]
+    # /metrics (Prometheus); met een token alleen met 'Authorization: Bearer <token>'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
 
     # Flask-Mail
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'localhost')
@@ -21,11 +62,66 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER')
+    # Ontvangers van foutmeldingen uit de logging (komma-gescheiden)
+    ADMINS = [address for address in os.getenv('ADMINS', '').split(',') if address]
+    # Uitgaande mail via rq (app.email): per SMTP-verbinding, pogingen, backoff (s, verdubbelt)
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', 50))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', 6))
+    MAIL_RETRY_BACKOFF = int(os.getenv('MAIL_RETRY_BACKOFF', 30))
+    MAIL_DEAD_LETTER_MAX = int(os.getenv('MAIL_DEAD_LETTER_MAX', 1000))
+    # Maximum aantal adressen per request aan /family/<id>/invites
+    INVITE_BULK_MAX = int(os.getenv('INVITE_BULK_MAX', 200))
+    # Opruimen van invites (app.invites.sweep_invites): dagen bewaard na verlopen/accepteren,
+    # interval in seconden, rijen per transactie
+    INVITE_RETENTION_DAYS = int(os.getenv('INVITE_RETENTION_DAYS', 30))
+    INVITE_SWEEP_INTERVAL = int(os.getenv('INVITE_SWEEP_INTERVAL', 86400))
+    INVITE_SWEEP_BATCH = int(os.getenv('INVITE_SWEEP_BATCH', 1000))
+
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://')
 
     POSTS_PER_PAGE = 25
+    # Push (SSE): events per kanaal bewaard voor replay, heartbeat in seconden
+    PUSH_STREAM_MAXLEN = int(os.getenv('PUSH_STREAM_MAXLEN', 1000))
+    PUSH_REPLAY_LIMIT = int(os.getenv('PUSH_REPLAY_LIMIT', 200))
+    PUSH_HEARTBEAT = int(os.getenv('PUSH_HEARTBEAT', 15))
+    # Notificaties voor /notifications: 'db' of 'redis' (feed per gebruiker, zie app.notifications)
+    NOTIFICATION_BACKEND = os.getenv('NOTIFICATION_BACKEND', 'db')
+    NOTIFICATION_FEED_MAXLEN = int(os.getenv('NOTIFICATION_FEED_MAXLEN', 100))
+    NOTIFICATION_FEED_TTL = int(os.getenv('NOTIFICATION_FEED_TTL', 7 * 86400))
+    # Profielfoto's: content-addressed op schijf, onbeperkt cachebaar
+    IMAGE_STORE_PATH = os.getenv('IMAGE_STORE_PATH', os.path.join(basedir, 'app', 'static', 'profile_pics'))
+    IMAGE_CACHE_MAX_AGE = int(os.getenv('IMAGE_CACHE_MAX_AGE', 31536000))
+    # Maximale grootte van een request (dus ook van een upload); groter = direct 413
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 8 * 1024 * 1024))
+    # Laat de webserver de bestanden versturen: X-Sendfile (Apache/lighttpd) of X-Accel-Redirect (nginx)
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'false').lower() in ['true', '1', 't']
+    IMAGE_ACCEL_REDIRECT = os.getenv('IMAGE_ACCEL_REDIRECT')
+    # last_seen: niet vaker schrijven dan de throttle, gebundeld per interval of batchgrootte
+    LAST_SEEN_THROTTLE = int(os.getenv('LAST_SEEN_THROTTLE', 60))
+    LAST_SEEN_FLUSH_INTERVAL = int(os.getenv('LAST_SEEN_FLUSH_INTERVAL', 10))
+    LAST_SEEN_FLUSH_BATCH = int(os.getenv('LAST_SEEN_FLUSH_BATCH', 100))
     AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN')
     AUTH0_CLIENT_ID = os.getenv('AUTH0_CLIENT_ID')
     AUTH0_CLIENT_SECRET = os.getenv('AUTH0_CLIENT_SECRET')
     # google cloud api
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
-    GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
\ No newline at end of file
+    GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+    GOOGLE_HTTP_TIMEOUT = float(os.getenv('GOOGLE_HTTP_TIMEOUT', 30))
+    # Vrije keep-alive verbindingen naar Google die per proces bewaard blijven
+    GOOGLE_HTTP_POOL_SIZE = int(os.getenv('GOOGLE_HTTP_POOL_SIZE', 10))
+    # Tokens verversen als ze binnen de marge verlopen; de achtergrondjob kijkt verder vooruit
+    CALENDAR_TOKEN_REFRESH_MARGIN = int(os.getenv('CALENDAR_TOKEN_REFRESH_MARGIN', 300))
+    CALENDAR_TOKEN_REFRESH_LOOKAHEAD = int(os.getenv('CALENDAR_TOKEN_REFRESH_LOOKAHEAD', 900))
+    CALENDAR_TOKEN_REFRESH_INTERVAL = int(os.getenv('CALENDAR_TOKEN_REFRESH_INTERVAL', 600))
+    # Reconciliatie van bijgehouden tellers (app.counters): interval in seconden, gebruikers per transactie
+    COUNTER_RECONCILE_INTERVAL = int(os.getenv('COUNTER_RECONCILE_INTERVAL', 3600))
+    COUNTER_RECONCILE_BATCH = int(os.getenv('COUNTER_RECONCILE_BATCH', 1000))
+    # Parallel ophalen van familie-agenda's: threads per worker en deadline per lid (seconden)
+    CALENDAR_FANOUT_WORKERS = int(os.getenv('CALENDAR_FANOUT_WORKERS', 8))
+    CALENDAR_FETCH_TIMEOUT = float(os.getenv('CALENDAR_FETCH_TIMEOUT', 10))
+    # Lokale event-store: 'redis' (gedeeld door alle workers) of 'memory' (per worker; alleen bij één worker)
+    EVENT_STORE_BACKEND = os.getenv('EVENT_STORE_BACKEND', 'redis')
+    EVENT_STORE_FRESHNESS = int(os.getenv('EVENT_STORE_FRESHNESS', 30))
+    EVENT_STORE_TTL = int(os.getenv('EVENT_STORE_TTL', 86400))
+    EVENT_STORE_MAX_ENTRIES = int(os.getenv('EVENT_STORE_MAX_ENTRIES', 1000))
+    EVENT_STORE_MAX_SPAN_DAYS = int(os.getenv('EVENT_STORE_MAX_SPAN_DAYS', 120))
@@ -0,0 +1,70 @@
+# Gunicorn-configuratie voor productie (zie Dockerfile).
+#
+# Standaard draaien we gevent-workers: een trage Google Calendar-call of een
+# open SSE-verbinding (/stream) wacht dan op I/O zonder een hele worker te
+# blokkeren. Met GUNICORN_WORKER_CLASS=sync of gthread valt het terug op
+# gewone (thread)workers.
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# gevent: gelijktijdige verbindingen per worker; gthread: threads per worker
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+threads = int(os.getenv('GUNICORN_THREADS', 8 if worker_class == 'gthread' else 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+accesslog = os.getenv('GUNICORN_ACCESSLOG', '-') or None
+# Standaardformaat plus de request-id die de app in de response zet (zie app.logs)
+access_log_format = os.getenv(
+    'GUNICORN_ACCESS_LOG_FORMAT',
+    '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s" %(M)sms rid=%({x-request-id}o)s'
+)
+
+# Prometheus multiprocess-modus: elke worker schrijft zijn metrics naar deze map
+# en /metrics telt ze op. Moet gezet zijn voordat prometheus_client geladen wordt.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'famplan-metrics'))
+
+# Niet preloaden: de gevent-worker moet de standaardbibliotheek monkey-patchen
+# vóórdat de app (SQLAlchemy-engine, Redis, httplib2, threads) geïmporteerd wordt.
+preload_app = False
+
+if worker_class == 'gevent':
+    # Geef de database-pool genoeg verbindingen voor veel gelijktijdige greenlets,
+    # tenzij ze expliciet gezet zijn (zie config.py)
+    os.environ.setdefault('DB_POOL_SIZE', '20')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '10')
+    # De fan-out pool voor Google-calls is per proces gedeeld; met greenlets is
+    # een grote pool goedkoop en anders wordt hij de bottleneck
+    os.environ.setdefault('CALENDAR_FANOUT_WORKERS', '200')
+
+
+def on_starting(server):
+    # Metrics van een vorige run horen niet bij deze
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    # psycopg2 is een C-extensie die gevent niet kan patchen; psycogreen laat
+    # het via gevent wachten op de socket in plaats van de hele worker te blokkeren
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen niet geïnstalleerd: PostgreSQL-queries blokkeren de gevent-worker')
+        return
+    patch_psycopg()
+    server.log.info('psycopg2 gepatcht voor gevent (worker %s)', worker.pid)
@@ -0,0 +1,136 @@
+"""
+Hoeveel bytes aan profielfoto's kost één chatpagina?
+
+Maakt in een tijdelijke SQLite-database een familie met `--authors` leden,
+elk met een grote JPEG als profielfoto (via dezelfde upload-pipeline als
+edit_profile), en `--posts` berichten. Daarna wordt de chatpagina gerenderd
+en elke afbeelding die erin staat opgehaald, zoals een browser dat doet:
+
+- webp: de <source srcset>, wat moderne browsers laden;
+- jpg:  de <img src>-fallback;
+- origineel: wat de pagina vóór de thumbnails per auteur liet laden (de
+  geüploade foto zelf).
+
+Gebruik (vanuit de projectmap):
+
+    python loadtest/avatar_bytes.py --authors 5 --posts 25
+"""
+import argparse
+import html
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def camera_photo(width, height, seed):
+    """
+    Een JPEG ongeveer zo groot als een foto van een telefoon: vloeiende
+    kleurvlakken (zodat een thumbnail niet egaal grijs wordt) met korrel.
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    base = Image.frombytes('RGB', (16, 12), rng.randbytes(16 * 12 * 3)).resize((width, height), Image.BICUBIC)
+    grain = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    image = Image.blend(base, grain, 0.3)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95)
+    buffer.seek(0)
+    return buffer
+
+
+def seed(app, authors, posts, width, height):
+    """Familie, auteurs met foto en posts; geeft (family_id, sub van de lezer, {digest: bytes van de upload})."""
+    import sqlalchemy as sa
+    from datetime import datetime, timedelta, timezone
+    from app import db
+    from app.avatars import process_upload
+    from app.image_store import image_store
+    from app.models import User, Family, Membership, Post
+
+    with app.app_context():
+        db.create_all()
+        family = Family(name='Avatar-benchmark')
+        db.session.add(family)
+        users, uploaded = [], {}
+        for n in range(authors):
+            photo = camera_photo(width, height, n)
+            size = len(photo.getvalue())
+            key, mimetype = process_upload(image_store, photo)
+            uploaded[key.rsplit('.', 1)[0]] = size
+            users.append(User(sub=f'avatarbench|{n}', username=f'avatarbench{n}',
+                              email=f'avatarbench{n}@example.com',
+                              profile_image=key, profile_image_mime=mimetype))
+        db.session.add_all(users)
+        db.session.flush()
+        for user in users:
+            db.session.add(Membership(user_id=user.id, family_id=family.id))
+        # Core-insert: geen push-events naar Redis voor de testdata
+        start = datetime.now(timezone.utc) - timedelta(minutes=posts)
+        db.session.execute(sa.insert(Post), [
+            {'body': f'Bericht {n}', 'user_id': users[n % authors].id, 'family_id': family.id,
+             'timestamp': start + timedelta(minutes=n)}
+            for n in range(posts)
+        ])
+        db.session.commit()
+        # De lezer is de eerste auteur; de rest staat met avatar in de chat
+        return family.id, users[0].sub, uploaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--authors', type=int, default=5)
+    parser.add_argument('--posts', type=int, default=25)
+    parser.add_argument('--width', type=int, default=2000)
+    parser.add_argument('--height', type=int, default=1500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='famplan-avatar-bench-')
+    os.environ.update(
+        DATABASE_URL=f'sqlite:///{os.path.join(workdir, "bench.db")}',
+        IMAGE_STORE_PATH=os.path.join(workdir, 'images'),
+        APP_SECRET_KEY='bench', MAIL_SERVER='', LOG_LEVEL='WARNING',
+    )
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    app = create_app()
+    family_id, sub, uploaded = seed(app, args.authors, args.posts, args.width, args.height)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'userinfo': {'sub': sub}}
+    page = client.get(f'/?family_id={family_id}').get_data(as_text=True)
+
+    # Per URL één keer tellen: de browser haalt een herhaalde avatar uit zijn cache
+    sources = {html.unescape(url) for url in re.findall(r'<source srcset="([^"]+)"', page)}
+    fallbacks = {html.unescape(url) for url in re.findall(r'<img\s+src="([^"]+/images/[^"]+)"', page)}
+
+    def fetched(urls):
+        responses = [client.get(url) for url in urls]
+        assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+        return sum(len(r.get_data()) for r in responses)
+
+    webp, jpg = fetched(sources), fetched(fallbacks)
+    # Vóór de thumbnails: de geüploade foto van elke auteur met een avatar in de chat
+    digests = {url.rsplit('/', 1)[-1].rsplit('-', 1)[0] for url in sources}
+    shown = len(digests)
+    original = sum(uploaded[digest] for digest in digests)
+
+    print(f'{args.posts} posts, {args.authors} auteurs met een {args.width}x{args.height} JPEG '
+          f'(gem. {sum(uploaded.values()) / len(uploaded) / 1e6:.1f} MB), {shown} avatars op de pagina, '
+          f'HTML {len(page.encode()) / 1024:.0f} KB')
+    print(f'{"variant":<10} {"bytes":>12}')
+    print(f'{"origineel":<10} {original:>12,}')
+    print(f'{"webp":<10} {webp:>12,}')
+    print(f'{"jpg":<10} {jpg:>12,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: wat kost het om een Google Calendar-client te maken?
+
+Vergelijkt per call:
+- build:  googleapiclient.discovery.build('calendar', 'v3') zoals vroeger,
+          per aanroep (statisch discovery-document, nieuwe Http);
+- cached: GoogleCalendarService.get_calendar_service, met het discovery-
+          document één keer per proces en Http-objecten uit de pool.
+
+Elke call draait in een nieuwe thread (`--mode thread`) of greenlet
+(`--mode gevent`), zoals een request onder de gthread- of gevent-worker;
+een cache per thread zou hier dus bij elke call opnieuw beginnen. Er
+gaat geen verkeer naar Google: het gaat om de opbouw van de client.
+
+    python loadtest/calendar_client.py --calls 500 --mode thread
+    python loadtest/calendar_client.py --calls 500 --mode gevent
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--mode', choices=['thread', 'gevent'], default='thread')
+    args = parser.parse_args()
+
+    if args.mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    import threading
+
+    sys.path.insert(0, ROOT)
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+    from app.calendar_service import GoogleCalendarService
+
+    credentials = Credentials(token='bench', refresh_token='bench', client_id='bench', client_secret='bench',
+                              token_uri='https://oauth2.googleapis.com/token')
+
+    def old_style():
+        build('calendar', 'v3', credentials=credentials, static_discovery=True, cache_discovery=False)
+
+    def cached():
+        GoogleCalendarService.get_calendar_service(credentials)
+
+    def measure(make_client):
+        # Eén call per nieuwe thread/greenlet, na elkaar: we meten de opbouw, niet de concurrency
+        started = time.perf_counter()
+        for _ in range(args.calls):
+            worker = threading.Thread(target=make_client)
+            worker.start()
+            worker.join()
+        return (time.perf_counter() - started) / args.calls * 1000
+
+    def baseline():
+        pass
+
+    cached()  # het discovery-document parsen telt als opstartkosten van het proces
+    overhead = measure(baseline)
+    print(f'{args.calls} calls, elk in een nieuwe {"greenlet" if args.mode == "gevent" else "thread"} '
+          f'(overhead {overhead:.3f} ms per thread afgetrokken)')
+    print(f'{"client":<8} {"ms/call":>9}')
+    for name, make_client in (('build', old_style), ('cached', cached)):
+        print(f'{name:<8} {measure(make_client) - overhead:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Loadtest voor /calendar/events tegen een gestubde, trage Google Calendar.
+
+Start per worker-class een gunicorn met gunicorn.conf.py, vuurt gedurende
+een vaste tijd gelijktijdige requests af en rapporteert requests/sec en
+latency (p50/p99). Google wordt vervangen door een stub die `--delay`
+seconden wacht (net als een trage API-call: wachten op I/O) en een paar
+vaste evenementen teruggeeft; de event-store staat op freshness 0, dus
+elk request doet echt een (gestubde) Google-call per agenda.
+
+Gebruik (vanuit de projectmap):
+
+    python loadtest/calendar_events.py --worker-class sync gevent \\
+        --workers 2 --concurrency 50 --duration 20 --delay 0.5
+
+De app voor gunicorn is `loadtest.calendar_events:create_stub_app()`.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_stub_app():
+    """De echte app, maar met een trage nep-Google (aangeroepen door gunicorn)."""
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from app.calendar_service import GoogleCalendarService
+
+    delay = float(os.environ['LOADTEST_GOOGLE_DELAY'])
+
+    def slow_list_event_window(service, time_min, time_max, calendar_id='primary', updated_min=None):
+        # time.sleep is onder gevent gepatcht, net als de socket van een echte call
+        time.sleep(delay)
+        start = time_min.astimezone(timezone.utc).replace(microsecond=0)
+        return [{
+            'id': f'stub{n}',
+            'summary': f'Stub event {n}',
+            'start': {'dateTime': (start + timedelta(hours=n)).isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=n, minutes=30)).isoformat()},
+        } for n in range(5)]
+
+    def slow_list_changed_events(service, updated_min, calendar_id='primary'):
+        time.sleep(delay)
+        return []
+
+    GoogleCalendarService.list_event_window = staticmethod(slow_list_event_window)
+    GoogleCalendarService.list_changed_events = staticmethod(slow_list_changed_events)
+    return create_app()
+
+
+def seed(members):
+    """Maak een gebruiker met `members` familieleden, allemaal met een gekoppelde agenda."""
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    from app.models import User, Family, Membership, CalendarCredentials
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        family = Family(name='Loadtest')
+        db.session.add(family)
+        users = [User(sub=f'loadtest|{n}', username=f'loadtest{n}', email=f'loadtest{n}@example.com')
+                 for n in range(members + 1)]
+        db.session.add_all(users)
+        db.session.flush()
+        for user in users:
+            db.session.add(Membership(user_id=user.id, family_id=family.id))
+            db.session.add(CalendarCredentials(
+                user_id=user.id, token='stub', refresh_token='stub',
+                token_uri='https://oauth2.googleapis.com/token',
+                client_id='stub', client_secret='stub',
+                scopes=json.dumps(['https://www.googleapis.com/auth/calendar']),
+                expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=365),
+            ))
+        db.session.commit()
+        # Een geldig sessiecookie voor de eerste gebruiker
+        serializer = app.session_interface.get_signing_serializer(app)
+        return serializer.dumps({'user': {'userinfo': {'sub': users[0].sub}}})
+
+
+def run_load(url, cookie, concurrency, duration):
+    latencies, failures = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            request = urllib.request.Request(url, headers={'Cookie': f'session={cookie}'})
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    ok = response.status == 200
+            except Exception:
+                ok = False
+            elapsed = time.monotonic() - started
+            with lock:
+                (latencies if ok else failures).append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures, time.monotonic() - started
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server kwam niet op: {url}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--worker-class', nargs='+', default=['sync', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--delay', type=float, default=0.5, help='gesimuleerde Google-latency (s)')
+    parser.add_argument('--members', type=int, default=3, help='familieleden met een agenda')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='famplan-loadtest-')
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.join(workdir, "loadtest.db")}',
+        APP_SECRET_KEY='loadtest', MAIL_SERVER='', FLASK_DEBUG='0',
+        # Per worker is hier genoeg: met freshness 0 gaat toch elk request naar (nep-)Google
+        EVENT_STORE_BACKEND='memory', EVENT_STORE_FRESHNESS='0', LOADTEST_GOOGLE_DELAY=str(args.delay),
+        GUNICORN_BIND=f'127.0.0.1:{args.port}', GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_ACCESSLOG='',
+    )
+    os.environ.update(env)
+    os.chdir(workdir)  # logs/ van de app komt in de tijdelijke map
+    cookie = seed(args.members)
+    url = f'http://127.0.0.1:{args.port}/calendar/events'
+
+    print(f'{args.concurrency} clients, {args.duration:.0f}s, {args.workers} workers, '
+          f'Google-latency {args.delay}s, {args.members + 1} agenda\'s per request')
+    print(f'{"worker":<8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"fouten":>7}')
+    for worker_class in args.worker_class:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+             '--pythonpath', ROOT, 'loadtest.calendar_events:create_stub_app()'],
+            cwd=workdir, env=dict(env, GUNICORN_WORKER_CLASS=worker_class),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(url)
+            latencies, failures, elapsed = run_load(url, cookie, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        if latencies:
+            p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+            print(f'{worker_class:<8} {len(latencies) / elapsed:>8.1f} '
+                  f'{statistics.median(latencies) * 1000:>8.0f} {p99 * 1000:>8.0f} {len(failures):>7}')
+        else:
+            print(f'{worker_class:<8} {"-":>8} {"-":>8} {"-":>8} {len(failures):>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark van het parallel ophalen van familie-agenda's tegen een gestubde,
+trage Google Calendar: volgt de latency het traagste lid of de som?
+
+Per aantal leden krijgt elk lid een vaste (seeded) vertraging tussen
+`--min-delay` en `--max-delay` seconden. We meten de oude manier (een lid
+na het andere) en GoogleCalendarService.get_events_concurrently, en zetten
+die af tegen de som en het maximum van de vertragingen. Met `--hang` hangt
+één extra lid langer dan `--timeout`: dat lid valt af en het geheel is
+binnen de deadline terug.
+
+    python loadtest/calendar_fanout.py --members 1 3 6 12 --max-delay 0.5
+    python loadtest/calendar_fanout.py --members 6 --hang --timeout 1
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--members', type=int, nargs='+', default=[1, 3, 6, 12])
+    parser.add_argument('--min-delay', type=float, default=0.1)
+    parser.add_argument('--max-delay', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=10, help='CALENDAR_FETCH_TIMEOUT')
+    parser.add_argument('--workers', type=int, default=8, help='CALENDAR_FANOUT_WORKERS')
+    parser.add_argument('--hang', action='store_true', help='één extra lid dat niet op tijd antwoordt')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from app.calendar_service import GoogleCalendarService
+
+    delays = {}
+
+    # De stub: de 'service' is de sleutel van het lid, een call wacht zijn vertraging af
+    def stub_service(credentials):
+        return credentials
+
+    def stub_get_events(service, time_min=None, time_max=None, max_results=10):
+        time.sleep(delays[service])
+        return [{'id': f'{service}-event', 'summary': 'Stub'}]
+
+    GoogleCalendarService.get_calendar_service = staticmethod(stub_service)
+    GoogleCalendarService.get_events = staticmethod(stub_get_events)
+
+    print(f'Google-latency per lid {args.min_delay}-{args.max_delay}s, {args.workers} workers, '
+          f'deadline {args.timeout}s{", plus één hangend lid" if args.hang else ""}')
+    print(f'{"leden":>6} {"som s":>7} {"max s":>7} {"na elkaar s":>12} {"parallel s":>11} {"gelukt":>7} {"fouten":>7}')
+    for count in args.members:
+        rng = random.Random(count)
+        delays.clear()
+        delays.update({f'lid{n}': rng.uniform(args.min_delay, args.max_delay) for n in range(count)})
+        members = list(delays)
+        if args.hang:
+            delays['hangt'] = args.timeout * 3
+
+        started = time.perf_counter()
+        for key in members:
+            stub_get_events(stub_service(key))
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results, errors = GoogleCalendarService.get_events_concurrently(
+            {key: key for key in delays}, timeout=args.timeout, max_workers=args.workers
+        )
+        concurrent = time.perf_counter() - started
+
+        member_delays = [delays[key] for key in members]
+        print(f'{count:>6} {sum(member_delays):>7.2f} {max(member_delays):>7.2f} {sequential:>12.2f} '
+              f'{concurrent:>11.2f} {len(results):>7} {len(errors):>7}')
+    # Hangende calls lopen nog in de pool; niet op ze wachten bij het afsluiten
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
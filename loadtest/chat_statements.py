@@ -0,0 +1,108 @@
+"""
+Telt de SQL-statements van één chatpagina: gelijk voor 5 en 60 posts?
+
+Maakt in een tijdelijke SQLite-database twee families met elk `--authors`
+leden: één met weinig posts, één met veel (meer dan een pagina). Daarna
+wordt van beide de chatpagina opgehaald met een before_cursor_execute-
+listener op de engine. Het aantal statements mag niet meegroeien met het
+aantal posts of auteurs (geen N+1); zo niet, dan exit-code 1 en de lijst.
+
+    python loadtest/chat_statements.py --posts 5 60 --authors 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(app, posts, authors):
+    """Eén familie per aantal posts, dezelfde lezer overal lid; geeft ({posts: family_id}, sub)."""
+    import sqlalchemy as sa
+    from datetime import datetime, timedelta, timezone
+    from app import db
+    from app.models import User, Family, Membership, Post
+
+    with app.app_context():
+        db.create_all()
+        reader = User(sub='stmtbench|reader', username='stmtbenchreader', email='reader@example.com')
+        db.session.add(reader)
+        families = {}
+        for count in posts:
+            family = Family(name=f'{count} posts')
+            members = [User(sub=f'stmtbench|{count}|{n}', username=f'stmtbench{count}x{n}',
+                            email=f'stmtbench{count}x{n}@example.com') for n in range(authors)]
+            db.session.add(family)
+            db.session.add_all(members)
+            db.session.flush()
+            for user in [reader] + members:
+                db.session.add(Membership(user_id=user.id, family_id=family.id))
+            # Core-insert: geen push-events naar Redis voor de testdata
+            start = datetime.now(timezone.utc) - timedelta(minutes=count)
+            db.session.execute(sa.insert(Post), [
+                {'body': f'Bericht {n}', 'user_id': members[n % authors].id, 'family_id': family.id,
+                 'timestamp': start + timedelta(minutes=n)}
+                for n in range(count)
+            ])
+            families[count] = family.id
+        db.session.commit()
+        return families, reader.sub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, nargs='+', default=[5, 60])
+    parser.add_argument('--authors', type=int, default=10)
+    parser.add_argument('--verbose', action='store_true', help='toon de statements')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='famplan-stmt-bench-')
+    os.environ.update(
+        DATABASE_URL=f'sqlite:///{os.path.join(workdir, "bench.db")}',
+        APP_SECRET_KEY='bench', MAIL_SERVER='', LOG_LEVEL='WARNING',
+    )
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    import sqlalchemy as sa
+    from app import create_app, db
+
+    app = create_app()
+    families, sub = seed(app, args.posts, args.authors)
+    with app.app_context():
+        engine = db.engine
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = {'userinfo': {'sub': sub}}
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    counts = {}
+    for count, family_id in families.items():
+        # Eerst één keer warm: de eerste request na het starten doet eenmalige lookups
+        client.get(f'/?family_id={family_id}')
+        statements.clear()
+        sa.event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = client.get(f'/?family_id={family_id}')
+        finally:
+            sa.event.remove(engine, 'before_cursor_execute', record)
+        assert response.status_code == 200, response.status_code
+        counts[count] = len(statements)
+        print(f'{count:>4} posts, {args.authors} auteurs: {len(statements)} statements')
+        if args.verbose:
+            for statement in statements:
+                print('   ', ' '.join(statement.split())[:160])
+
+    if len(set(counts.values())) != 1:
+        print('FOUT: het aantal statements groeit mee met het aantal posts')
+        sys.exit(1)
+    print('OK: gelijk aantal statements')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Gelijktijdig inwisselen van één invite: er mag er maar één slagen.
+
+Maakt een familie met één invite en `--users` gebruikers aan en laat die
+allemaal tegelijk (achter een barrière) redeem_invite doen. Verwacht: precies
+één JOINED, de rest USED, en één nieuw lidmaatschap. Met `--same-user`
+probeert één gebruiker het `--users` keer tegelijk (dubbelklik, retries).
+Draai tegen de echte database uit de omgeving:
+
+    DATABASE_URL=postgresql://... python loadtest/invite_redemption.py --users 50 --rounds 20
+
+De gebruikers heten 'redeembench|<n>' en worden bij een volgende run hergebruikt.
+Exit-code 1 als een ronde meer of minder dan één lidmaatschap oplevert.
+"""
+import argparse
+import collections
+import os
+import secrets
+import sys
+import threading
+from datetime import datetime, timezone, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed_users(app, users):
+    import sqlalchemy as sa
+    from app import db
+    from app.models import User
+
+    with app.app_context():
+        db.create_all()
+        existing = set(db.session.scalars(sa.select(User.sub).where(User.sub.like('redeembench|%'))))
+        missing = [n for n in range(users) if f'redeembench|{n}' not in existing]
+        if missing:
+            db.session.execute(sa.insert(User), [
+                {'sub': f'redeembench|{n}', 'username': f'redeembench{n}', 'email': f'redeembench{n}@example.com'}
+                for n in missing
+            ])
+            db.session.commit()
+        return db.session.scalars(
+            sa.select(User.id).where(User.sub.like('redeembench|%')).order_by(User.id).limit(users)
+        ).all()
+
+
+def run_round(app, user_ids):
+    """Eén familie, één invite, alle gebruikers tegelijk; geeft (uitkomsten, lidmaatschappen)."""
+    import sqlalchemy as sa
+    from app import db
+    from app.models import Family, FamilyInvite, Membership
+    from app.invites import redeem_invite
+
+    with app.app_context():
+        family = Family(name='redeembench')
+        db.session.add(family)
+        db.session.flush()
+        token = secrets.token_urlsafe(16)
+        db.session.add(FamilyInvite(
+            family_id=family.id, token=token,
+            expires_at=datetime.now(timezone.utc) + timedelta(hours=1),
+        ))
+        db.session.commit()
+        family_id = family.id
+
+    outcomes = collections.Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(user_ids))
+
+    def redeem(user_id):
+        with app.app_context():
+            barrier.wait()
+            try:
+                outcome, _ = redeem_invite(token, user_id)
+            except Exception as e:
+                outcome = f'error: {type(e).__name__}'
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        with lock:
+            outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=redeem, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        members = db.session.scalar(
+            sa.select(sa.func.count(Membership.id)).where(Membership.family_id == family_id)
+        )
+        # Opruimen: de benchmarkfamilie is alleen voor deze ronde
+        db.session.execute(sa.delete(Membership).where(Membership.family_id == family_id))
+        db.session.execute(sa.delete(FamilyInvite).where(FamilyInvite.family_id == family_id))
+        db.session.execute(sa.delete(Family).where(Family.id == family_id))
+        db.session.commit()
+    return outcomes, members
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20, help='gelijktijdige pogingen per ronde')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--same-user', action='store_true', help='alle pogingen door één gebruiker')
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Genoeg verbindingen, anders wachten de threads op de pool in plaats van op elkaar
+    os.environ.setdefault('DB_POOL_SIZE', str(args.users))
+    from app import create_app
+
+    app = create_app()
+    user_ids = seed_users(app, 1 if args.same_user else args.users)
+    if args.same_user:
+        user_ids = user_ids * args.users
+
+    totals = collections.Counter()
+    failed = 0
+    for number in range(1, args.rounds + 1):
+        outcomes, members = run_round(app, user_ids)
+        totals.update(outcomes)
+        ok = members == 1 and outcomes['joined'] == 1
+        failed += not ok
+        print(f'ronde {number:>3}: {dict(outcomes)}, lidmaatschappen: {members}{"" if ok else "  <-- FOUT"}')
+    print(f'totaal: {dict(totals)}; {failed} van {args.rounds} rondes fout')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
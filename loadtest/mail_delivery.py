@@ -0,0 +1,177 @@
+"""
+Controle van de mailaflevering tegen een lokale SMTP-server (aiosmtpd).
+
+Start een aiosmtpd-Controller die één adres met 550 weigert en zet de app
+erop (MAIL_SERVER/MAIL_PORT). Daarna drie controles:
+
+- batches: `--messages` e-mails via queue_emails in batches van
+  `--batch-size`; de jobs worden hier uitgevoerd zoals een rq-worker dat
+  doet. Verwacht: één SMTP-verbinding per batch en alles afgeleverd
+  behalve het geweigerde adres;
+- dead-letter: het bericht aan het geweigerde adres en een bericht met
+  een ongeldige header staan in de dead-letter-lijst, na één poging
+  (5xx en kapotte berichten worden niet opnieuw geprobeerd), en de rest
+  van hun batch is precies één keer afgeleverd;
+- foutlog: met een SMTP-server die `--smtp-delay` seconden over DATA doet,
+  komt app.logger.error (SMTPHandler via logs.start_queue_listener) direct
+  terug, en de foutmail komt daarna alsnog aan.
+
+Redis is nodig voor de wachtrij en de dead-letter-lijst; gebruik een lege
+database. Gebruik (vanuit de projectmap):
+
+    REDIS_URL=redis://localhost:6379/15 python loadtest/mail_delivery.py --messages 25 --batch-size 10
+
+Exit-code 1 als een van de controles faalt.
+"""
+import argparse
+import asyncio
+import email
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REJECTED = 'bestaat-niet@example.com'
+BROKEN = 'kapot@example.com'
+ADMIN = 'beheer@example.com'
+
+
+class RecordingHandler:
+    """aiosmtpd-handler: weigert REJECTED met 550 en onthoudt per bericht de verbinding, ontvangers en inhoud."""
+
+    def __init__(self):
+        self.delay = 0
+        self.received = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REJECTED:
+            return '550 5.1.1 Mailbox does not exist'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        # session.peer (adres, poort) is uniek per open verbinding
+        self.received.append((session.peer, list(envelope.rcpt_tos), email.message_from_bytes(envelope.content)))
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def check(ok, text):
+    print(f'{"OK  " if ok else "FOUT"} {text}')
+    return ok
+
+
+def run_batches(app, handler, count, batch_size):
+    """
+    queue_emails en dan de nieuwe jobs uitvoeren; geeft (jobs, verbindingen,
+    afgeleverde ontvangers, nieuwe dead letters).
+    """
+    from app.email import queue_emails, DEAD_LETTER_KEY
+
+    messages = [{'subject': f'Bericht {n}', 'recipients': [f'lid{n}@example.com'], 'body': f'Hallo {n}'}
+                for n in range(count - 2)]
+    messages.insert(count // 2, {'subject': 'Geweigerd', 'recipients': [REJECTED], 'body': 'Hallo'})
+    # Header-injectie in het onderwerp: flask-mail weigert het bericht al bij het bouwen
+    messages.insert(count // 3, {'subject': 'Kapot\r\nBcc: iedereen@example.com',
+                                 'recipients': [BROKEN], 'body': 'Hallo'})
+
+    queue = app.task_queue
+    dead_before = app.redis.llen(DEAD_LETTER_KEY)
+    existing = set(queue.job_ids)
+    with app.app_context():
+        assert queue_emails(messages), 'queue_emails: Redis niet bereikbaar'
+    jobs = [queue.fetch_job(job_id) for job_id in queue.job_ids if job_id not in existing]
+    for job in jobs:
+        # Zoals een rq-worker: de functie uit de job met zijn argumenten
+        job.func(*job.args, **job.kwargs)
+        queue.remove(job)
+
+    # lpush: de nieuwe dead letters staan vooraan
+    added = app.redis.llen(DEAD_LETTER_KEY) - dead_before
+    dead = [json.loads(raw) for raw in app.redis.lrange(DEAD_LETTER_KEY, 0, added - 1)] if added else []
+    # Zonder de foutmails aan ADMINS: dead_letter logt met logger.error en die gaan ook via SMTP
+    batch_mail = [(peer, rcpt_tos) for peer, rcpt_tos, _ in handler.received if ADMIN not in rcpt_tos]
+    connections = {peer for peer, _ in batch_mail}
+    delivered = [address for _, rcpt_tos in batch_mail for address in rcpt_tos]
+    return len(jobs), len(connections), delivered, dead
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--messages', type=int, default=25)
+    parser.add_argument('--batch-size', type=int, default=10, help='MAIL_BATCH_SIZE')
+    parser.add_argument('--smtp-delay', type=float, default=2.0, help='seconden per DATA bij de foutlog-controle')
+    args = parser.parse_args()
+
+    if 'REDIS_URL' not in os.environ:
+        parser.error('zet REDIS_URL; wachtrij en dead-letter-lijst staan in Redis')
+    from aiosmtpd.controller import Controller
+
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+
+    workdir = tempfile.mkdtemp(prefix='famplan-mail-check-')
+    os.environ.update(
+        DATABASE_URL=f'sqlite:///{os.path.join(workdir, "check.db")}',
+        APP_SECRET_KEY='check', FLASK_DEBUG='0', LOG_LEVEL='WARNING',
+        MAIL_SERVER='127.0.0.1', MAIL_PORT=str(controller.port), MAIL_USE_TLS='false',
+        MAIL_DEFAULT_SENDER='famplan@example.com', ADMINS=ADMIN,
+        MAIL_BATCH_SIZE=str(args.batch_size),
+    )
+    os.chdir(workdir)  # logs/ van de app komt in de tijdelijke map
+    sys.path.insert(0, ROOT)
+    from app import create_app
+
+    app = create_app()
+    passed = True
+    try:
+        batches, connections, delivered, dead = run_batches(app, handler, args.messages, args.batch_size)
+        print(f'{args.messages} e-mails, batches van {args.batch_size}, SMTP op poort {controller.port}')
+        passed &= check(connections == batches,
+                        f'{batches} batches over {connections} SMTP-verbindingen')
+        passed &= check(len(delivered) == args.messages - 2 and len(set(delivered)) == len(delivered),
+                        f'{len(delivered)} van {args.messages - 2} afleverbare e-mails afgeleverd, '
+                        f'{len(delivered) - len(set(delivered))} dubbel')
+        for address, expected in ((REJECTED, '550'), (BROKEN, 'BadHeaderError')):
+            entries = [entry for entry in dead if entry['message']['recipients'] == [address]]
+            passed &= check(len(entries) == 1 and expected in entries[0]['error'] and entries[0]['attempts'] == 1,
+                            f'dead-letter {address}: '
+                            f'{entries[0]["error"] if entries else "ontbreekt"}')
+        passed &= check(len(dead) == 2, f'{len(dead)} nieuwe dead letters')
+
+        handler.received.clear()
+        handler.delay = args.smtp_delay
+        with app.test_request_context('/'):
+            started = time.monotonic()
+            app.logger.error('Controle: foutmelding via SMTPHandler')
+            logged = time.monotonic() - started
+        passed &= check(logged < args.smtp_delay / 10,
+                        f'app.logger.error kwam na {logged * 1000:.1f} ms terug (SMTP doet {args.smtp_delay:.1f} s)')
+        deadline = time.monotonic() + args.smtp_delay + 10
+        arrived = []
+        while not arrived and time.monotonic() < deadline:
+            time.sleep(0.05)
+            arrived = [rcpt_tos for _, rcpt_tos, message in handler.received
+                       if 'Controle: foutmelding' in message.get_payload()]
+        passed &= check(bool(arrived) and all(rcpt_tos == [ADMIN] for rcpt_tos in arrived),
+                        f'foutmail aan {ADMIN} {"aangekomen" if arrived else "niet aangekomen"} '
+                        f'na {time.monotonic() - started:.1f} s')
+    finally:
+        controller.stop()
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
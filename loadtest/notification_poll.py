@@ -0,0 +1,146 @@
+"""
+Benchmark van de /notifications-poll: database tegen de Redis-feed.
+
+Maakt `--users` gebruikers met elk een paar notificaties aan en laat daarna
+`--concurrency` threads gedurende `--duration` seconden polls doen voor
+willekeurige gebruikers, zoals open tabs dat doen: meestal met `since` op de
+laatst geziene notificatie (niets nieuws), een deel vanaf 0 (nieuwe tab).
+Per backend rapporteren we polls/sec, latency (p50/p99) en SQL-statements
+per poll. Meet tegen de echte database en Redis uit de omgeving:
+
+    DATABASE_URL=postgresql://... REDIS_URL=redis://... \\
+        python loadtest/notification_poll.py --users 10000 --concurrency 50
+
+De gebruikers heten 'pollbench|<n>' en worden bij een volgende run hergebruikt.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(app, users, per_user):
+    """Zorg voor `users` benchmarkgebruikers met `per_user` notificaties; geeft {user_id: laatste timestamp}."""
+    import sqlalchemy as sa
+    from app import db
+    from app.models import User, Notification
+
+    with app.app_context():
+        db.create_all()
+        existing = dict(db.session.execute(
+            sa.select(User.sub, User.id).where(User.sub.like('pollbench|%'))
+        ).all())
+        missing = [n for n in range(users) if f'pollbench|{n}' not in existing]
+        for start in range(0, len(missing), 1000):
+            db.session.execute(sa.insert(User), [
+                {'sub': f'pollbench|{n}', 'username': f'pollbench{n}', 'email': f'pollbench{n}@example.com'}
+                for n in missing[start:start + 1000]
+            ])
+        db.session.commit()
+        user_ids = db.session.scalars(
+            sa.select(User.id).where(User.sub.like('pollbench|%')).order_by(User.id).limit(users)
+        ).all()
+        db.session.execute(sa.delete(Notification).where(Notification.user_id.in_(
+            sa.select(User.id).where(User.sub.like('pollbench|%'))
+        )))
+        now = time.time()
+        rows = [
+            {'user_id': user_id, 'name': f'bench_{k}', 'timestamp': now - (per_user - k) * 60,
+             'payload_json': json.dumps({'count': k})}
+            for user_id in user_ids for k in range(per_user)
+        ]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(sa.insert(Notification), rows[start:start + 5000])
+        db.session.commit()
+        return {user_id: now - 60 for user_id in user_ids}
+
+
+def run_polls(app, feed, latest, concurrency, duration, fresh_ratio):
+    import sqlalchemy as sa
+    from app import db
+
+    latencies, queries = [], [0]
+    lock = threading.Lock()
+    user_ids = list(latest)
+    deadline = time.monotonic() + duration
+
+    with app.app_context():
+        engine = db.engine
+
+    def count_query(*args):
+        with lock:
+            queries[0] += 1
+
+    sa.event.listen(engine, 'before_cursor_execute', count_query)
+
+    def client():
+        rng = random.Random()
+        own = []
+        while time.monotonic() < deadline:
+            user_id = rng.choice(user_ids)
+            since = 0.0 if rng.random() < fresh_ratio else latest[user_id]
+            with app.app_context():
+                started = time.perf_counter()
+                feed.since(user_id, since)
+                own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    sa.event.remove(engine, 'before_cursor_execute', count_query)
+    return latencies, queries[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--per-user', type=int, default=5, help='notificaties per gebruiker')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--fresh-ratio', type=float, default=0.05, help='deel van de polls met since=0')
+    parser.add_argument('--backend', nargs='+', default=['db', 'redis'])
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import create_app
+    from app.notifications import NotificationFeed
+
+    app = create_app()
+    latest = seed(app, args.users, args.per_user)
+
+    print(f'{args.users} gebruikers x {args.per_user} notificaties, {args.concurrency} threads, '
+          f'{args.duration:.0f}s, {args.fresh_ratio:.0%} polls met since=0')
+    print(f'{"backend":<8} {"polls/s":>9} {"p50 ms":>8} {"p99 ms":>8} {"SQL/poll":>9}')
+    for backend in args.backend:
+        app.config['NOTIFICATION_BACKEND'] = backend
+        feed = NotificationFeed()
+        feed.init_app(app)
+        if backend == 'redis':
+            # Koude start: de eerste poll per gebruiker bouwt de feed op, die telt niet mee
+            app.redis.delete(*[key for user_id in latest for key in feed._keys(user_id)])
+            with app.app_context():
+                for user_id in latest:
+                    feed.since(user_id, latest[user_id])
+        latencies, queries, elapsed = run_polls(
+            app, feed, latest, args.concurrency, args.duration, args.fresh_ratio
+        )
+        p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) > 1 else latencies[0]
+        print(f'{backend:<8} {len(latencies) / elapsed:>9.0f} {statistics.median(latencies) * 1000:>8.2f} '
+              f'{p99 * 1000:>8.2f} {queries / len(latencies):>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
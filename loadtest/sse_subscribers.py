@@ -0,0 +1,195 @@
+"""
+Loadtest voor /stream: hoeveel idle SSE-abonnees houdt één worker vast?
+
+Start per worker-class één gunicorn-worker met gunicorn.conf.py, opent
+`--subscribers` gelijktijdige /stream-verbindingen (zoals open chat-tabs
+met EventSource) en meet daarna:
+- het extra geheugen (RSS) van de worker met alle abonnees verbonden;
+- hoe lang het duurt tot één nieuwe post bij alle abonnees binnen is.
+
+Redis is nodig voor pub/sub tussen dit proces (dat de post plaatst) en de
+worker; de database is een tijdelijke SQLite. Gebruik (vanuit de projectmap):
+
+    REDIS_URL=redis://localhost:6379/15 python loadtest/sse_subscribers.py \\
+        --worker-class gevent gthread --subscribers 200 1000
+
+Met gthread kost elke open verbinding een thread (GUNICORN_THREADS wordt op
+het aantal abonnees gezet); met sync kan een worker er maar één tegelijk aan.
+"""
+import argparse
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed():
+    """Eén familie met één gebruiker; geeft (family_id, user_id, sessiecookie)."""
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    from app.models import User, Family, Membership
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        family = Family(name='SSE-loadtest')
+        user = User(sub='ssebench|0', username='ssebench0', email='ssebench0@example.com')
+        db.session.add_all([family, user])
+        db.session.flush()
+        db.session.add(Membership(user_id=user.id, family_id=family.id))
+        db.session.commit()
+        serializer = app.session_interface.get_signing_serializer(app)
+        cookie = serializer.dumps({'user': {'userinfo': {'sub': user.sub}}})
+        return app, family.id, user.id, cookie
+
+
+def post_message(app, family_id, user_id, body):
+    """Plaats een post zoals de chat dat doet; de commit publiceert hem via Redis."""
+    from app import db
+    from app.models import Post
+
+    with app.test_request_context():
+        db.session.add(Post(body=body, user_id=user_id, family_id=family_id))
+        db.session.commit()
+
+
+def open_subscribers(port, cookie, count, timeout):
+    """Open `count` /stream-verbindingen en wacht tot elk de eerste SSE-regel heeft."""
+    request = (
+        'GET /stream HTTP/1.1\r\n'
+        f'Host: 127.0.0.1:{port}\r\n'
+        f'Cookie: session={cookie}\r\n'
+        'Accept: text/event-stream\r\n\r\n'
+    ).encode()
+    sockets = []
+    for _ in range(count):
+        sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+        sock.sendall(request)
+        sockets.append(sock)
+    ready = wait_for(sockets, b'retry:', timeout)
+    return sockets, ready
+
+
+def wait_for(sockets, marker, timeout):
+    """Lees van alle sockets tot elk `marker` heeft gezien; geeft het aantal dat het haalde."""
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    for sock in sockets:
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        buffers[sock] = b''
+    done = 0
+    deadline = time.monotonic() + timeout
+    while buffers and time.monotonic() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            sock = key.fileobj
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                continue
+            if not data:
+                selector.unregister(sock)
+                del buffers[sock]
+                continue
+            buffers[sock] += data
+            if marker in buffers[sock]:
+                selector.unregister(sock)
+                del buffers[sock]
+                done += 1
+    selector.close()
+    return done
+
+
+def worker_pid(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        children = f.read().split()
+    return int(children[0])
+
+
+def rss_mb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except urllib.error.HTTPError:
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server kwam niet op: {url}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--worker-class', nargs='+', default=['gevent'])
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[200, 1000])
+    parser.add_argument('--timeout', type=float, default=60, help='max. seconden voor verbinden/afleveren')
+    parser.add_argument('--port', type=int, default=5056)
+    args = parser.parse_args()
+
+    if 'REDIS_URL' not in os.environ:
+        parser.error('zet REDIS_URL; worker en loadtest delen Redis voor pub/sub')
+    workdir = tempfile.mkdtemp(prefix='famplan-sse-loadtest-')
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.join(workdir, "loadtest.db")}',
+        APP_SECRET_KEY='loadtest', MAIL_SERVER='', FLASK_DEBUG='0', LOG_LEVEL='WARNING',
+        GUNICORN_BIND=f'127.0.0.1:{args.port}', GUNICORN_WORKERS='1', GUNICORN_ACCESSLOG='',
+        # Ruim boven het aantal abonnees, anders meet je de limiet in plaats van de worker
+        GUNICORN_WORKER_CONNECTIONS=str(max(args.subscribers) + 100),
+        GUNICORN_TIMEOUT='0',
+    )
+    os.environ.update(env)
+    os.chdir(workdir)  # logs/ van de app komt in de tijdelijke map
+    app, family_id, user_id, cookie = seed()
+
+    print(f'1 worker, idle /stream-verbindingen, Redis {os.environ["REDIS_URL"]}')
+    print(f'{"worker":<8} {"abonnees":>9} {"verbonden":>10} {"+RSS MB":>8} {"MB/1000":>8} '
+          f'{"fan-out s":>10} {"ontvangen":>10}')
+    for worker_class in args.worker_class:
+        for count in args.subscribers:
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                 '--pythonpath', ROOT, 'app:create_app()'],
+                cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                env=dict(env, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_THREADS=str(count + 10)),
+            )
+            sockets = []
+            try:
+                wait_until_up(f'http://127.0.0.1:{args.port}/healthz/db')
+                pid = worker_pid(server.pid)
+                baseline = rss_mb(pid)
+                sockets, connected = open_subscribers(args.port, cookie, count, args.timeout)
+                time.sleep(1)  # de worker laten bijkomen voordat we meten
+                extra = rss_mb(pid) - baseline
+
+                started = time.monotonic()
+                post_message(app, family_id, user_id, f'fan-out naar {count}')
+                received = wait_for(sockets, b'event: post', args.timeout)
+                fan_out = time.monotonic() - started
+            finally:
+                for sock in sockets:
+                    sock.close()
+                server.terminate()
+                server.wait()
+            print(f'{worker_class:<8} {count:>9} {connected:>10} {extra:>8.1f} '
+                  f'{extra / count * 1000:>8.1f} {fan_out:>10.2f} {received:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Add full-text search to Post and Message
+
+Revision ID: 4f8e2b6d1a93
+Revises: 9a1c5e3f7b28
+Create Date: 2026-10-17 16:40:51.126093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8e2b6d1a93'
+down_revision = '9a1c5e3f7b28'
+branch_labels = None
+depends_on = None
+
+# Moet gelijk zijn aan app.search.TS_CONFIG
+TS_CONFIG = 'simple'
+
+
+def upgrade():
+    # PostgreSQL: een gegenereerde tsvector-kolom (bijgewerkt bij elke insert en
+    # update van body) met een GIN-index. SQLite krijgt FTS5-tabellen via
+    # app.search.init_app, zodat ze batch-migraties overleven.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('post', 'message'):
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{TS_CONFIG}', coalesce(body, ''))) STORED"
+        )
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'], unique=False,
+                        postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('post', 'message'):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table)
+        op.drop_column(table, 'search_vector')
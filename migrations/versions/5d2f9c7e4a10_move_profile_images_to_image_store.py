@@ -0,0 +1,75 @@
+"""Move profile images out of the user table into the image store
+
+Revision ID: 5d2f9c7e4a10
+Revises: c3e8a1f5b7d2
+Create Date: 2026-10-17 13:40:21.507316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+from app.image_store import LocalImageStore, is_valid_key
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f9c7e4a10'
+down_revision = 'c3e8a1f5b7d2'
+branch_labels = None
+depends_on = None
+
+
+user = sa.table(
+    'user',
+    sa.column('id', sa.Integer),
+    sa.column('profile_image', sa.String),
+    sa.column('profile_image_data', sa.LargeBinary),
+    sa.column('profile_image_mime', sa.String),
+)
+
+
+def _store():
+    store = LocalImageStore()
+    store.init_app(current_app)
+    return store
+
+
+def upgrade():
+    conn = op.get_bind()
+    store = _store()
+    user_ids = conn.execute(
+        sa.select(user.c.id).where(user.c.profile_image_data.isnot(None))
+    ).scalars().all()
+    # Eén BLOB tegelijk, zodat het geheugengebruik beperkt blijft
+    for user_id in user_ids:
+        data, mime = conn.execute(
+            sa.select(user.c.profile_image_data, user.c.profile_image_mime)
+            .where(user.c.id == user_id)
+        ).one()
+        conn.execute(
+            user.update().where(user.c.id == user_id)
+            .values(profile_image=store.save(data, mime))
+        )
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('profile_image_data')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('profile_image_data', sa.LargeBinary(), nullable=True))
+
+    conn = op.get_bind()
+    store = _store()
+    rows = conn.execute(
+        sa.select(user.c.id, user.c.profile_image).where(user.c.profile_image.isnot(None))
+    ).all()
+    for user_id, key in rows:
+        if not is_valid_key(key) or not store.exists(key):
+            continue
+        with open(store.path(key), 'rb') as f:
+            data = f.read()
+        conn.execute(
+            user.update().where(user.c.id == user_id)
+            .values(profile_image_data=data, profile_image=None)
+        )